@@ -0,0 +1,92 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+import etl_carga
+from etl_midia import COLS_FINAIS
+
+# ==============================================================================
+# BENCHMARK DA CARGA DA FATO: COPY x INSERT multi
+# ==============================================================================
+# Carrega um DataFrame sintético com as colunas de COLS_FINAIS numa tabela
+# temporária (LIKE fato_midia, sem FKs) e mede linhas/segundo de cada método.
+# Tudo roda numa transação que é desfeita no fim: nada fica no banco.
+#   python bench_carga.py --linhas 50000 --repeticoes 3
+
+def gerar_carga(linhas, semente=42):
+    rng = np.random.default_rng(semente)
+    nulos = rng.random(linhas) < 0.05
+    df = pd.DataFrame({
+        'code': [f"BR{i:06d}" for i in range(linhas)],
+        'size': rng.choice(['9x3', '4x3', 'Digital', None], linhas),
+        'frequency': rng.choice(['Semanal', 'Bissemanal', None], linhas),
+        'period_quantity': rng.integers(1, 12, linhas).astype(float),
+        'insertion_faces_period': rng.integers(1, 40, linhas).astype(float),
+        'start_date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 300, linhas), unit='D'),
+        'weekly_flow': rng.random(linhas) * 1e6,
+        'weekly_impact': rng.random(linhas) * 1e6,
+        'periodic_impact': np.where(nulos, np.nan, rng.random(linhas) * 1e7),
+        'faces_x_frequency': rng.integers(1, 100, linhas).astype(float),
+        'cpm_target': rng.random(linhas) * 50,
+        'net_total': np.where(nulos, np.nan, rng.random(linhas) * 1e5),
+        'total_bonus': rng.random(linhas) * 1e3,
+        'total_final': rng.random(linhas) * 1e5,
+        'id_display_type': np.where(nulos, np.nan, rng.integers(1, 10, linhas)),
+        'id_exibidor': rng.integers(1, 500, linhas).astype(float),
+        'id_campaign': rng.integers(1, 50, linhas).astype(float),
+        'id_target': rng.integers(1, 20, linhas).astype(float),
+        'id_media': rng.integers(1, 200, linhas).astype(float),
+        'id_cliente': 1,
+        'arquivo_origem': 'BENCH/carga.xlsx',
+        'file_timestamp': time.time(),
+        'is_active': True,
+        'country': 'BRASIL',
+        'market': rng.choice(['São Paulo', 'Rio De Janeiro', 'Belo Horizonte', 'Curitiba'], linhas),
+        'state': rng.choice(['SP', 'RJ', 'MG', 'PR'], linhas),
+        'location': [f"Av. Paulista, {i} - \"Lado A\"\nSentido Centro" for i in range(linhas)],
+    })
+    df['end_date'] = df['start_date'] + pd.to_timedelta(rng.integers(7, 60, linhas), unit='D')
+    return df[[c for c in COLS_FINAIS if c in df.columns]]
+
+def medir(engine, df_carga, metodo, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        with engine.connect() as conn:
+            trans = conn.begin()
+            conn.execute(text("CREATE TEMP TABLE bench_fato_midia (LIKE fato_midia INCLUDING DEFAULTS)"))
+            inicio = time.perf_counter()
+            if metodo == 'copy': etl_carga.copiar_dataframe(conn, df_carga, 'bench_fato_midia')
+            else: etl_carga.inserir_multi(conn, df_carga, 'bench_fato_midia')
+            tempos.append(time.perf_counter() - inicio)
+            total = conn.execute(text("SELECT COUNT(*) FROM bench_fato_midia")).scalar()
+            if total != len(df_carga): raise RuntimeError(f"{metodo}: {total} linhas carregadas de {len(df_carga)}")
+            trans.rollback()
+    return min(tempos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark COPY x INSERT multi na fato_midia.")
+    parser.add_argument('--linhas', type=int, default=50_000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    load_dotenv()
+    str_conexao = (f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}"
+                   f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}")
+    engine = create_engine(str_conexao)
+    df_carga = gerar_carga(args.linhas)
+
+    print(f"\n--- BENCHMARK CARGA: {args.linhas} linhas, melhor de {args.repeticoes} ---")
+    resultados = {}
+    for metodo in ['multi', 'copy']:
+        segundos = medir(engine, df_carga, metodo, args.repeticoes)
+        resultados[metodo] = args.linhas / segundos
+        print(f"  {metodo:>5}: {segundos:8.2f}s | {resultados[metodo]:12,.0f} linhas/s")
+    print(f"  COPY é {resultados['copy'] / resultados['multi']:.1f}x mais rápido.")
+
+
+if __name__ == '__main__':
+    main()
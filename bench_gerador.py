@@ -0,0 +1,133 @@
+import os
+import argparse
+import datetime
+import numpy as np
+from openpyxl import Workbook
+
+# ==============================================================================
+# GERADOR DE PLANOS SINTÉTICOS (BENCHMARK)
+# ==============================================================================
+# Monta uma pasta no mesmo formato de CAMINHO_MIDIA: <pasta>/<CLIENTE>/<plano>.xlsx
+#   * layout padrão  -> aba 'Media Plan', linhas de lixo antes do cabeçalho CODE
+#                       (deslocamento aleatório), rodapé TOTAL e sujeira depois
+#   * layout Bradesco -> aba 'Capa' (DEMANDA/CAMPANHA) + 'MIDIA OBRIGATÓRIA' e
+#                       'MIDIA AVULSA' com cabeçalho Cidade/Exibidor e rodapé TOTAL
+# Nomes de exibidor/mídia ganham erros de digitação na taxa pedida, para exercitar
+# alias + fuzzy. Mesma semente -> mesmos planos.
+#   python bench_gerador.py ./bench_pasta --arquivos 50 --linhas 500 --taxa-erro 0.1
+
+EXIBIDORES = ['ELETROMIDIA', 'JCDECAUX', 'OTIMA', 'CLEAR CHANNEL', 'KALLAS MIDIA', 'PRIME OOH', 'NOVA MIDIA',
+              'IMPRESSIONE', 'BAND OOH', 'GLOBAL OUTDOOR', 'RZK DIGITAL', 'PAINEL URBANO', 'MIDIA LOCAL', 'INDOOR BRASIL']
+MEDIAS = ['PAINEL DIGITAL', 'EMPENA', 'RELOGIO DE RUA', 'ABRIGO DE ONIBUS', 'TOTEM', 'LED', 'OUTDOOR', 'BACKLIGHT',
+          'FRONTLIGHT', 'MUB', 'ELEVADOR', 'METRO', 'AEROPORTO', 'SHOPPING']
+CLASSIFICACOES = ['DOOH', 'OOH']
+TIPOS = ['DIGITAL', 'ESTATICO', 'SEGMENTADO']
+PRACAS = [('São Paulo', 'SP'), ('Rio De Janeiro', 'RJ'), ('Belo Horizonte', 'MG'), ('Curitiba', 'PR'),
+          ('Porto Alegre', 'RS'), ('Salvador', 'BA'), ('Recife', 'PE'), ('Brasília', 'DF'), ('Fortaleza', 'CE')]
+CAMPANHAS = ['LANÇAMENTO VERÃO', 'INSTITUCIONAL', 'BLACK FRIDAY', 'COPA', 'NATAL', 'VOLTA AS AULAS']
+TARGETS = ['AS ABC 18+', 'AS AB 25-49', 'HOMENS 18-34', 'MULHERES 25+']
+
+CABECALHO_PADRAO = ['CODE', 'Campaign', 'Target', 'Country', 'Market', 'State', 'Location', 'Exhibitor', 'Media',
+                    'Classification', 'Type', 'Size', 'Frequency', 'Period Quantity', 'Insertion\nFaces Period',
+                    'Start Date', 'End Date', 'Weekly Flow', 'Weekly Impact', 'Periodic Impact', 'Faces x Frequency',
+                    'CPM/Target', 'Net Total', 'Net Value Bonus/ Reapplication', 'Efetivo Total (Net + Fee)']
+CABECALHO_BRADESCO = ['Item', 'Cidade', 'UF', 'Exibidor', 'Tipo', 'Tipo de Mídia', 'Mídia', 'Formato', 'Período',
+                      'Faces', 'Data de Início', 'Data de Término', 'Potencial de Impacto POP',
+                      'CPM (Desembolso)', 'R$ Total Liquido']
+
+
+def com_erro(nome, rng, taxa_erro):
+    # Troca, apaga, duplica uma letra ou muda a caixa: o tipo de erro que aparece nos planos
+    if rng.random() >= taxa_erro or len(nome) < 4: return nome
+    i = int(rng.integers(1, len(nome) - 1)); tipo = int(rng.integers(0, 4))
+    if tipo == 0: return nome[:i] + nome[i + 1] + nome[i] + nome[i + 2:]
+    if tipo == 1: return nome[:i] + nome[i + 1:]
+    if tipo == 2: return nome[:i] + nome[i] + nome[i:]
+    return nome.title()
+
+def _datas(rng):
+    inicio = datetime.datetime(2025, 1, 1) + datetime.timedelta(days=int(rng.integers(0, 330)))
+    return inicio, inicio + datetime.timedelta(days=int(rng.integers(7, 60)))
+
+def _lixo(ws, rng, linhas):
+    # Logo/cliente/observações que ficam acima do cabeçalho nos planos reais
+    for i in range(linhas):
+        ws.append([None, f"Observação {i}" if rng.random() < 0.5 else None, None, 'Agência Altermark' if i == 0 else None])
+
+def gerar_plano_padrao(caminho, linhas, taxa_erro, rng):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Resumo'); ws.append(['Plano de mídia']); ws.append(['Gerado para benchmark'])
+    ws = wb.create_sheet('Media Plan')
+    _lixo(ws, rng, int(rng.integers(0, 12)))
+    ws.append(CABECALHO_PADRAO)
+    campanha = str(rng.choice(CAMPANHAS)); total = 0.0
+    for i in range(linhas):
+        praca, uf = PRACAS[int(rng.integers(len(PRACAS)))]
+        inicio, fim = _datas(rng)
+        fluxo = float(rng.integers(10_000, 2_000_000)); liquido = round(float(rng.random()) * 50_000, 2); total += liquido
+        ws.append([f"SP{int(rng.integers(0, 999_999)):06d}", campanha, str(rng.choice(TARGETS)), 'Brasil', praca, uf,
+                   f"Av. Exemplo, {i} - Sentido {'Centro' if i % 2 else 'Bairro'}",
+                   com_erro(str(rng.choice(EXIBIDORES)), rng, taxa_erro), com_erro(str(rng.choice(MEDIAS)), rng, taxa_erro),
+                   str(rng.choice(CLASSIFICACOES)), str(rng.choice(TIPOS)), '9x3', 'Semanal', int(rng.integers(1, 9)),
+                   int(rng.integers(1, 40)), inicio, fim, fluxo, fluxo * 0.7, fluxo * 2.8, int(rng.integers(1, 100)),
+                   round(float(rng.random()) * 40, 2), liquido, 0, round(liquido * 1.1, 2)])
+    ws.append(['TOTAL'] + [None] * 21 + [round(total, 2)])
+    ws.append([]); ws.append(['Observações: valores líquidos, sem impostos.'])
+    wb.save(caminho)
+
+def gerar_plano_bradesco(caminho, linhas, taxa_erro, rng):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Capa')
+    ws.append([]); ws.append([None, 'DEMANDA', f"DEM-{int(rng.integers(1000, 9999))}"])
+    ws.append([None, 'CAMPANHA', str(rng.choice(CAMPANHAS))]); ws.append([None, 'AGÊNCIA', 'Altermark'])
+    for nome_aba, fracao in (('MIDIA OBRIGATÓRIA', 0.6), ('MIDIA AVULSA', 0.4)):
+        ws = wb.create_sheet(nome_aba)
+        _lixo(ws, rng, int(rng.integers(1, 8)))
+        ws.append(CABECALHO_BRADESCO)
+        total = 0.0
+        for i in range(max(1, int(linhas * fracao))):
+            praca, uf = PRACAS[int(rng.integers(len(PRACAS)))]
+            inicio, fim = _datas(rng); liquido = round(float(rng.random()) * 30_000, 2); total += liquido
+            ws.append([i + 1, praca, uf, com_erro(str(rng.choice(EXIBIDORES)), rng, taxa_erro),
+                       com_erro(str(rng.choice(MEDIAS)), rng, taxa_erro), str(rng.choice(CLASSIFICACOES)),
+                       f"Ponto {i} - {praca}", '9x3', int(rng.integers(1, 5)), int(rng.integers(1, 20)), inicio, fim,
+                       float(rng.integers(10_000, 3_000_000)), round(float(rng.random()) * 30, 2), liquido])
+        ws.append([None, 'TOTAL'] + [None] * 12 + [round(total, 2)])
+    wb.save(caminho)
+
+def gerar_pasta(destino, arquivos=20, linhas=500, taxa_erro=0.1, fracao_bradesco=0.2, clientes=3, semente=42):
+    """Gera `arquivos` planos em destino/<CLIENTE>/. Devolve a lista de caminhos."""
+    rng = np.random.default_rng(semente)
+    nomes_clientes = [f"CLIENTE_{i:02d}" for i in range(1, clientes + 1)]
+    caminhos = []
+    for i in range(arquivos):
+        bradesco = rng.random() < fracao_bradesco
+        cliente = 'BRADESCO' if bradesco else nomes_clientes[i % len(nomes_clientes)]
+        os.makedirs(os.path.join(destino, cliente), exist_ok=True)
+        caminho = os.path.join(destino, cliente, f"plano_{i:04d}.xlsx")
+        # Cada plano com sua própria semente: regenerar um arquivo não muda os outros
+        rng_plano = np.random.default_rng([semente, i])
+        linhas_plano = max(1, int(linhas * rng_plano.uniform(0.5, 1.5)))
+        if bradesco: gerar_plano_bradesco(caminho, linhas_plano, taxa_erro, rng_plano)
+        else: gerar_plano_padrao(caminho, linhas_plano, taxa_erro, rng_plano)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera planos de mídia sintéticos para benchmark.")
+    parser.add_argument('destino')
+    parser.add_argument('--arquivos', type=int, default=20)
+    parser.add_argument('--linhas', type=int, default=500, help="Linhas médias por plano (varia de 50%% a 150%%).")
+    parser.add_argument('--taxa-erro', type=float, default=0.1, help="Fração dos nomes de exibidor/mídia com erro de digitação.")
+    parser.add_argument('--fracao-bradesco', type=float, default=0.2)
+    parser.add_argument('--clientes', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    caminhos = gerar_pasta(args.destino, args.arquivos, args.linhas, args.taxa_erro, args.fracao_bradesco, args.clientes, args.semente)
+    print(f"-> {len(caminhos)} planos gerados em {args.destino}")
+
+
+if __name__ == '__main__':
+    main()
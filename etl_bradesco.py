@@ -2,20 +2,95 @@ import pandas as pd
 import os
 from thefuzz import process, fuzz
 import settings # <--- Importa o arquivo de configurações
+import etl_planilha
+import etl_cache
 
-def ler_plano_bradesco(caminho_arquivo):
+def _eh_cabecalho_bradesco(valores):
+    linha_str = [str(v).upper() for v in valores]
+    return 'CIDADE' in linha_str and 'EXIBIDOR' in linha_str
+
+def _coluna_cidade(cabecalho):
+    return next((i for i, v in enumerate(cabecalho) if v == 'Cidade'), None)
+
+# Para de ler cada aba de mídia no primeiro TOTAL da coluna 'Cidade'
+LIMITE_BRADESCO = etl_planilha.LimiteTotal('cidade|exibidor', _eh_cabecalho_bradesco, _coluna_cidade)
+
+def _ler_aba_dados(planilha, aba, linha_header):
+    # linha_header=None procura o cabeçalho; senão só confere a linha já conhecida
+    df_bruto = planilha.aba(aba, limite=LIMITE_BRADESCO)
+    if linha_header is None:
+        linha_header = -1
+        for i, row in df_bruto.head(etl_planilha.LINHAS_BUSCA_CABECALHO).iterrows():
+            if _eh_cabecalho_bradesco(row.tolist()):
+                linha_header = i; break
+    elif linha_header >= len(df_bruto) or not _eh_cabecalho_bradesco(df_bruto.iloc[linha_header].tolist()): return None, -1
+    if linha_header == -1: return None, -1
+
+    df_dados = etl_planilha.promover_cabecalho(df_bruto, linha_header)
+    if 'Cidade' in df_dados.columns:
+        coluna_cidade = df_dados['Cidade'].astype(str).str.upper()
+        indices_total = df_dados.index[coluna_cidade.str.contains('TOTAL', na=False)].tolist()
+        if indices_total:
+            df_dados = df_dados.iloc[:indices_total[0]]
+        df_dados = df_dados.dropna(subset=['Cidade'])
+    return df_dados, int(linha_header)
+
+def _juntar_abas(planilha, abas_dados, linhas_cabecalho):
+    # linhas_cabecalho vazio -> procura e preenche {aba: linha, -1 se a aba não tem cabeçalho};
+    # cheio -> usa as linhas guardadas e devolve None se alguma aba não bater com o modelo.
+    conhecidas = dict(linhas_cabecalho)
+    if conhecidas and set(conhecidas) != set(abas_dados): return None
+    dfs_para_juntar = []
+    for aba in abas_dados:
+        linha_conhecida = conhecidas.get(aba)
+        df_dados, linha_header = _ler_aba_dados(planilha, aba, None if linha_conhecida == -1 else linha_conhecida)
+        if conhecidas and (df_dados is None) != (linha_conhecida == -1): return None
+        if not conhecidas: linhas_cabecalho[aba] = linha_header
+        if df_dados is not None: dfs_para_juntar.append(df_dados)
+    if not dfs_para_juntar: return None
+
+    df_final = pd.concat(dfs_para_juntar, ignore_index=True)
+    df_final.columns = df_final.columns.astype(str).str.replace('\n', ' ').str.strip().str.lower()
+    return df_final
+
+def _mapear_colunas_bradesco(colunas):
+    # {coluna do banco: coluna do Excel} com os sinônimos do settings
+    mapeamento = {}
+    for col_banco, lista_sinonimos in settings.SINONIMOS_BRADESCO.items():
+        melhor_coluna_excel = None
+        
+        # --- DECISÃO: O QUE RODA O FUZZY (90%)? ---
+        if col_banco in ['start_date', 'end_date', 'periodic_impact']:
+            melhor_score = 0
+            for sinonimo in lista_sinonimos:
+                match_tuple = process.extractOne(sinonimo, colunas, scorer=fuzz.token_sort_ratio)
+                if match_tuple and match_tuple[1] >= 90 and match_tuple[1] > melhor_score:
+                    melhor_score = match_tuple[1]
+                    melhor_coluna_excel = match_tuple[0]
+        else:
+            # RODA EXACT MATCH
+            for sinonimo in lista_sinonimos:
+                match = next((c for c in colunas if sinonimo == c), None) 
+                if match:
+                    melhor_coluna_excel = match
+                    break
+        
+        mapeamento[col_banco] = melhor_coluna_excel
+    return mapeamento
+
+def ler_plano_bradesco(caminho_arquivo, planilha=None):
     print(f"     [MODO BRADESCO] Iniciando leitura complexa...")
     
     try:
-        xls = pd.ExcelFile(caminho_arquivo)
+        if planilha is None: planilha = etl_planilha.PlanilhaBruta(caminho_arquivo)
         
         # 1. EXTRAÇÃO DE METADADOS (CAPA)
         codigo_demanda = None
         nome_campanha = None
         
-        if 'Capa' in xls.sheet_names:
+        if 'Capa' in planilha.sheet_names:
             try:
-                df_capa = pd.read_excel(xls, sheet_name='Capa', header=None)
+                df_capa = planilha.aba('Capa', nrows=20)
                 for i, row in df_capa.head(20).iterrows():
                     celula_b = str(row[1]).strip().upper()
                     if 'DEMANDA' in celula_b: codigo_demanda = str(row[2]).strip()
@@ -25,60 +100,31 @@ def ler_plano_bradesco(caminho_arquivo):
         if not codigo_demanda: codigo_demanda = os.path.basename(caminho_arquivo)
 
         # 2. LEITURA DAS ABAS DE DADOS
-        dfs_para_juntar = []
         abas_alvo = ['MIDIA OBRIGATÓRIA', 'MÍDIA OBRIGATÓRIA', 'MIDIA AVULSA', 'MÍDIA AVULSA', 'MIDIA OBRIGATORIA']
-        
-        for aba in xls.sheet_names:
-            if aba.upper() in abas_alvo:
-                df_temp = pd.read_excel(xls, sheet_name=aba, header=None, nrows=30)
-                linha_header = -1
-                for i, row in df_temp.iterrows():
-                    linha_str = row.astype(str).str.upper().values
-                    if 'CIDADE' in linha_str and 'EXIBIDOR' in linha_str:
-                        linha_header = i; break
-                
-                if linha_header != -1:
-                    df_dados = pd.read_excel(xls, sheet_name=aba, header=linha_header)
-                    if 'Cidade' in df_dados.columns:
-                        coluna_cidade = df_dados['Cidade'].astype(str).str.upper()
-                        indices_total = df_dados.index[coluna_cidade.str.contains('TOTAL', na=False)].tolist()
-                        if indices_total:
-                            df_dados = df_dados.iloc[:indices_total[0]]
-                        df_dados = df_dados.dropna(subset=['Cidade'])
-                    
-                    dfs_para_juntar.append(df_dados)
+        abas_dados = [aba for aba in planilha.sheet_names if aba.upper() in abas_alvo]
 
-        if not dfs_para_juntar:
-            print("     [ERRO] Nenhuma aba de mídia encontrada.")
-            return None
-            
-        df_final = pd.concat(dfs_para_juntar, ignore_index=True)
+        # Modelo já visto (mesmas abas, cabeçalhos nas mesmas linhas, colunas iguais):
+        # reaproveita as linhas de cabeçalho e o mapeamento, sem fuzzy nas colunas
+        df_final = None
+        for layout in etl_cache.layouts_conhecidos('bradesco', planilha.sheet_names):
+            df_final = _juntar_abas(planilha, abas_dados, layout['linhas'])
+            if df_final is not None and list(df_final.columns) == layout['cabecalho']:
+                mapeamento = layout['colunas']; break
+            df_final = None
 
-        # 3. PADRONIZAÇÃO VIA SINÔNIMOS (USANDO SETTINGS)
-        df_final.columns = df_final.columns.astype(str).str.replace('\n', ' ').str.strip().str.lower()
-        
+        if df_final is None:
+            linhas_cabecalho = {}
+            df_final = _juntar_abas(planilha, abas_dados, linhas_cabecalho)
+            if df_final is None:
+                print("     [ERRO] Nenhuma aba de mídia encontrada.")
+                return None
+            mapeamento = _mapear_colunas_bradesco(df_final.columns)
+            etl_cache.lembrar_layout('bradesco', planilha.sheet_names, {'linhas': linhas_cabecalho,
+                                                                        'cabecalho': list(df_final.columns), 'colunas': mapeamento})
+
+        # 3. PADRONIZAÇÃO VIA SINÔNIMOS (MAPEAMENTO DO SETTINGS)
         df_padronizado = pd.DataFrame()
-        
-        # Usa a lista que está no arquivo settings.py
-        for col_banco, lista_sinonimos in settings.SINONIMOS_BRADESCO.items():
-            melhor_coluna_excel = None
-            
-            # --- DECISÃO: O QUE RODA O FUZZY (90%)? ---
-            if col_banco in ['start_date', 'end_date', 'periodic_impact']:
-                melhor_score = 0
-                for sinonimo in lista_sinonimos:
-                    match_tuple = process.extractOne(sinonimo, df_final.columns, scorer=fuzz.token_sort_ratio)
-                    if match_tuple and match_tuple[1] >= 90 and match_tuple[1] > melhor_score:
-                        melhor_score = match_tuple[1]
-                        melhor_coluna_excel = match_tuple[0]
-            else:
-                # RODA EXACT MATCH
-                for sinonimo in lista_sinonimos:
-                    match = next((c for c in df_final.columns if sinonimo == c), None) 
-                    if match:
-                        melhor_coluna_excel = match
-                        break
-            
+        for col_banco, melhor_coluna_excel in mapeamento.items():
             if melhor_coluna_excel:
                 df_padronizado[col_banco] = df_final[melhor_coluna_excel]
         
@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# CACHE EM DISCO DOS PLANOS LIDOS (settings.PASTA_CACHE)
+# ==============================================================================
+# Chaves montadas a partir do hash do conteúdo do Excel, então renomear/tocar o
+# arquivo (OneDrive reescrevendo mtime) não invalida nada. Cada entrada é um
+# .parquet quando o DataFrame cabe sem perda (colunas objeto só com texto/None);
+# senão (grades brutas, colunas com tipos misturados) vai em .pkl. Sem pyarrow nem
+# fastparquet instalados, tudo vai em .pkl.
+# O último acesso fica no mtime do arquivo, usado pela poda LRU.
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''): sha.update(bloco)
+    return sha.hexdigest()
+
+def assinatura_leitor():
+    # Muda quando a lógica dos leitores (VERSAO_LEITOR) ou os sinônimos do settings mudam.
+    conteudo = repr((settings.VERSAO_LEITOR, settings.PALAVRA_CHAVE_PADRAO, settings.SINONIMOS_ABAS_PADRAO,
+                     settings.SINONIMOS_COLUNAS_PADRAO, settings.SINONIMOS_BRADESCO))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:12]
+
+def _caminho(chave, extensao): return os.path.join(settings.PASTA_CACHE, f"{chave}{extensao}")
+
+def _motor_parquet():
+    for modulo in ('pyarrow', 'fastparquet'):
+        try: __import__(modulo); return True
+        except ImportError: pass
+    return False
+
+TEM_MOTOR_PARQUET = _motor_parquet()
+
+def _cabe_em_parquet(df):
+    if not TEM_MOTOR_PARQUET: return False
+    if not all(isinstance(c, str) for c in df.columns): return False
+    return all(pd.api.types.infer_dtype(df[c], skipna=True) in ('string', 'empty')
+               for c in df.columns if df[c].dtype == object)
+
+def _ler_parquet(caminho):
+    # Nulo do Parquet volta como None nas colunas de texto; a leitura do Excel dá NaN, e a
+    # limpeza (astype(str)) transformaria None em 'None'/'NONE' e mudaria a chave_linha
+    df = pd.read_parquet(caminho)
+    for col in df.columns:
+        if df[col].dtype == object: df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def ler(chave):
+    for extensao, leitor in (('.parquet', _ler_parquet), ('.pkl', pd.read_pickle)):
+        caminho = _caminho(chave, extensao)
+        if not os.path.exists(caminho): continue
+        try:
+            df = leitor(caminho)
+            os.utime(caminho)
+            return df
+        except Exception: return None
+    return None
+
+def gravar(chave, df):
+    try:
+        os.makedirs(settings.PASTA_CACHE, exist_ok=True)
+        extensao = '.parquet' if _cabe_em_parquet(df) else '.pkl'
+        temporario = _caminho(chave, f"{extensao}.{os.getpid()}.tmp")
+        if extensao == '.parquet': df.to_parquet(temporario)
+        else: df.to_pickle(temporario)
+        os.replace(temporario, _caminho(chave, extensao))  # atômico: workers podem gravar ao mesmo tempo
+    except Exception as e: print(f"     [AVISO] Cache não gravado ({e}).")
+
+def podar(tamanho_max_mb=None):
+    # Remove as entradas acessadas há mais tempo até caber em CACHE_TAMANHO_MAX_MB.
+    # Só olha a raiz de PASTA_CACHE: subpastas (snapshot das dimensões) ficam de fora.
+    tamanho_max = (tamanho_max_mb or settings.CACHE_TAMANHO_MAX_MB) * 1024 * 1024
+    if not os.path.isdir(settings.PASTA_CACHE): return 0
+    entradas = []
+    for nome in os.listdir(settings.PASTA_CACHE):
+        if not nome.endswith(('.parquet', '.pkl')): continue
+        caminho = os.path.join(settings.PASTA_CACHE, nome)
+        info = os.stat(caminho); entradas.append((info.st_mtime, info.st_size, caminho))
+    total = sum(tamanho for _, tamanho, _ in entradas); removidos = 0
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= tamanho_max: break
+        try: os.remove(caminho); total -= tamanho; removidos += 1
+        except OSError: pass
+    return removidos
+
+
+# --- CACHE DE LAYOUTS (MODELOS DE PLANILHA JÁ RESOLVIDOS) ---
+# Os planejadores reaproveitam poucos modelos. Para cada conjunto de nomes de abas
+# guarda os layouts já vistos: aba(s), linha do cabeçalho, cabeçalho normalizado e
+# qual coluna do Excel vira cada coluna do banco. Nomes das abas + cabeçalho igual =
+# mesmo modelo, e o leitor pula a busca de aba/cabeçalho e o casamento de sinônimos.
+# O JSON leva a assinatura_leitor() no nome: mudar sinônimos no settings invalida tudo.
+LAYOUTS_POR_ABAS = 20
+_layouts = {}   # caminho do json -> {chave das abas: [layouts]}
+
+def _arquivo_layouts(): return os.path.join(settings.PASTA_CACHE, f"layouts_{assinatura_leitor()}.json")
+
+def _ler_json_layouts(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+def _chave_abas(tipo, abas): return hashlib.sha1(repr((tipo, list(abas))).encode('utf-8')).hexdigest()[:16]
+
+def layouts_conhecidos(tipo, abas):
+    caminho = _arquivo_layouts()
+    if caminho not in _layouts: _layouts[caminho] = _ler_json_layouts(caminho)
+    return list(_layouts[caminho].get(_chave_abas(tipo, abas), []))
+
+def lembrar_layout(tipo, abas, layout):
+    caminho = _arquivo_layouts(); chave = _chave_abas(tipo, abas)
+    if layout in _layouts.setdefault(caminho, {}).get(chave, []): return
+    try:
+        os.makedirs(settings.PASTA_CACHE, exist_ok=True)
+        # Relê o arquivo antes de gravar: outros workers podem ter aprendido modelos também
+        todos = _ler_json_layouts(caminho)
+        conhecidos = [l for l in todos.get(chave, []) if l != layout]
+        todos[chave] = ([layout] + conhecidos)[:LAYOUTS_POR_ABAS]
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f: json.dump(todos, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+        _layouts[caminho] = todos
+    except Exception as e: print(f"     [AVISO] Layout não gravado ({e}).")
@@ -0,0 +1,142 @@
+import io
+import weakref
+import pandas as pd
+from sqlalchemy import text
+import etl_metricas
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# CARGA DA FATO (COPY FROM STDIN COM FALLBACK PARA to_sql)
+# ==============================================================================
+# O COPY recebe o DataFrame já serializado em CSV num buffer em memória, em lotes
+# de settings.COPY_LOTE_LINHAS, sem montar listas de linhas em Python.
+# Semântica igual à do to_sql(method='multi'):
+#   * NaN / None / NaT viram NULL (marcador \N, string vazia continua string vazia);
+#   * colunas inteiras do banco que chegam como float (ids com NaN) são arredondadas
+#     para Int64, como o Postgres faria no cast float -> integer do INSERT.
+
+MARCADOR_NULL = '\\N'
+_TIPOS_INTEIROS = ('smallint', 'integer', 'bigint')
+# Um cache por engine: cada engine tem seu search_path (ex.: schema do benchmark)
+_colunas_inteiras_cache = weakref.WeakKeyDictionary()
+
+def _colunas_inteiras(conn, tabela_referencia):
+    cache = _colunas_inteiras_cache.setdefault(conn.engine, {})
+    if tabela_referencia not in cache:
+        linhas = conn.execute(text("""SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :t"""), {"t": tabela_referencia})
+        cache[tabela_referencia] = {c for c, tipo in linhas if tipo in _TIPOS_INTEIROS}
+    return cache[tabela_referencia]
+
+def _preparar_tipos(conn, df_carga, tabela_referencia):
+    inteiras = _colunas_inteiras(conn, tabela_referencia)
+    ajustes = {c: df_carga[c].round().astype('Int64') for c in df_carga.columns
+               if c in inteiras and pd.api.types.is_float_dtype(df_carga[c])}
+    return df_carga.assign(**ajustes) if ajustes else df_carga
+
+def copiar_dataframe(conn, df_carga, tabela, tabela_referencia='fato_midia'):
+    df_carga = _preparar_tipos(conn, df_carga, tabela_referencia)
+    colunas = ", ".join(df_carga.columns)
+    sql_copy = f"COPY {tabela} ({colunas}) FROM STDIN WITH (FORMAT csv, NULL '{MARCADOR_NULL}')"
+    cursor = conn.connection.cursor()
+    try:
+        for inicio in range(0, len(df_carga), settings.COPY_LOTE_LINHAS):
+            buffer = io.StringIO()
+            df_carga.iloc[inicio:inicio + settings.COPY_LOTE_LINHAS].to_csv(buffer, index=False, header=False, na_rep=MARCADOR_NULL)
+            buffer.seek(0)
+            cursor.copy_expert(sql_copy, buffer); etl_metricas.contar_round_trip()
+    finally: cursor.close()
+
+def inserir_multi(conn, df_carga, tabela):
+    # Colunas category (MODO_MEMORIA = 'enxuto') voltam a objeto só para o to_sql
+    categorias = {c: object for c in df_carga.columns if isinstance(df_carga[c].dtype, pd.CategoricalDtype)}
+    if categorias: df_carga = df_carga.astype(categorias)
+    df_carga.to_sql(tabela, con=conn, if_exists='append', index=False, method='multi')
+
+def carregar_fato(conn, df_carga, tabela='fato_midia'):
+    # Tenta COPY dentro de um SAVEPOINT: se falhar (driver sem copy_expert, tipo
+    # inesperado...), desfaz só o COPY e cai no caminho antigo sem abortar a transação.
+    if settings.METODO_CARGA == 'copy':
+        try:
+            with conn.begin_nested():
+                copiar_dataframe(conn, df_carga, tabela)
+            return 'copy'
+        except Exception as e: print(f"     [AVISO] COPY falhou ({e}). Usando INSERT multi.")
+    inserir_multi(conn, df_carga, tabela)
+    return 'multi'
+
+# --- TROCA VIA STAGING ---
+TABELA_STAGING = 'stg_fato_midia'
+
+def preparar_staging(conn, colunas):
+    # Temporária da sessão só com as colunas da carga (sem PK/defaults/FKs da fato), recriada a cada arquivo.
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABELA_STAGING}"))
+    conn.execute(text(f"CREATE TEMP TABLE {TABELA_STAGING} AS SELECT {', '.join(colunas)} FROM fato_midia WITH NO DATA"))
+
+def substituir_fato(conn, df_carga, arquivo_origem, apagar_antigo=True):
+    # Carrega as linhas novas na staging (COPY, sem tocar na fato) e só no fim troca as
+    # linhas do arquivo com um DELETE + INSERT ... SELECT, que é rápido e segura os
+    # locks da fato pelo menor tempo possível até o commit.
+    colunas = list(df_carga.columns)
+    preparar_staging(conn, colunas)
+    carregar_fato(conn, df_carga, tabela=TABELA_STAGING)
+    removidas = 0
+    if apagar_antigo:
+        removidas = conn.execute(text("DELETE FROM fato_midia WHERE arquivo_origem = :arq"), {"arq": arquivo_origem}).rowcount
+    lista = ", ".join(colunas)
+    inseridas = conn.execute(text(f"INSERT INTO fato_midia ({lista}) SELECT {lista} FROM {TABELA_STAGING}")).rowcount
+    return {'inseridas': inseridas, 'atualizadas': 0, 'removidas': removidas}
+
+# --- MERGE INCREMENTAL (MODO_ATUALIZACAO = 'merge') ---
+COLS_CHAVE_LINHA = ['code', 'location', 'start_date', 'end_date', 'exibidor']
+# Não entram na comparação: mudam a cada versão do arquivo sem mudar a linha
+COLS_FORA_DO_DIFF = {'arquivo_origem', 'chave_linha', 'file_timestamp'}
+
+def garantir_chave_linha(engine):
+    with engine.begin() as conn:
+        existe = conn.execute(text("SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = 'fato_midia' AND column_name = 'chave_linha'")).scalar()
+        if not existe: conn.execute(text("ALTER TABLE fato_midia ADD COLUMN chave_linha TEXT"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fato_midia_arquivo_chave ON fato_midia (arquivo_origem, chave_linha)"))
+
+def calcular_chave_linha(df):
+    # Chave estável por linha do plano: hash de code + location + datas + exibidor, mais a
+    # ocorrência (linhas repetidas no mesmo plano viram -0, -1, ...). Tudo normalizado para
+    # texto antes do hash, para não depender do dtype que o Excel produziu nesta leitura.
+    partes = pd.DataFrame(index=df.index)
+    for col in COLS_CHAVE_LINHA:
+        serie = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if col in ('start_date', 'end_date'):
+            serie = pd.to_datetime(serie, errors='coerce', format='mixed').dt.strftime('%Y-%m-%d')
+        partes[col] = serie.astype(str).str.strip().str.upper()
+    hashes = pd.util.hash_pandas_object(partes, index=False)
+    ocorrencia = hashes.groupby(hashes).cumcount()
+    return hashes.map('{:016x}'.format) + '-' + ocorrencia.astype(str)
+
+def mesclar_fato(conn, df_carga, arquivo_origem):
+    # Aplica só a diferença entre a versão nova (staging) e a que está na fato:
+    # remove chaves que sumiram, atualiza as que mudaram e insere as novas.
+    colunas = list(df_carga.columns)
+    preparar_staging(conn, colunas)
+    carregar_fato(conn, df_carga, tabela=TABELA_STAGING)
+    params = {"arq": arquivo_origem}
+
+    removidas = conn.execute(text(f"""DELETE FROM fato_midia f WHERE f.arquivo_origem = :arq
+        AND NOT EXISTS (SELECT 1 FROM {TABELA_STAGING} s WHERE s.chave_linha = f.chave_linha)"""), params).rowcount
+
+    comparadas = [c for c in colunas if c not in COLS_FORA_DO_DIFF]
+    atribuicoes = ", ".join(f"{c} = s.{c}" for c in comparadas + ['file_timestamp'] if c in colunas)
+    atualizadas = conn.execute(text(f"""UPDATE fato_midia f SET {atribuicoes} FROM {TABELA_STAGING} s
+        WHERE f.arquivo_origem = :arq AND f.chave_linha = s.chave_linha
+        AND ({', '.join('f.' + c for c in comparadas)}) IS DISTINCT FROM ({', '.join('s.' + c for c in comparadas)})"""), params).rowcount
+
+    lista = ", ".join(colunas)
+    inseridas = conn.execute(text(f"""INSERT INTO fato_midia ({lista}) SELECT {lista} FROM {TABELA_STAGING} s
+        WHERE NOT EXISTS (SELECT 1 FROM fato_midia f WHERE f.arquivo_origem = :arq AND f.chave_linha = s.chave_linha)"""), params).rowcount
+    return {'inseridas': inseridas, 'atualizadas': atualizadas, 'removidas': removidas}
+
+def atualizar_fato(conn, df_carga, arquivo_origem, modo_operacao):
+    if modo_operacao == 'ATUALIZAR' and settings.MODO_ATUALIZACAO == 'merge':
+        return mesclar_fato(conn, df_carga, arquivo_origem)
+    # NOVO também apaga: um arquivo removido (linhas inativas) que volta depois de reiniciar
+    # o ETL chega como NOVO, e as linhas antigas com a mesma chave_linha não podem ficar ao lado
+    return substituir_fato(conn, df_carga, arquivo_origem, apagar_antigo=True)
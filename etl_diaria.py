@@ -0,0 +1,102 @@
+from sqlalchemy import text
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# FATO DIARIZADA (fato_midia_diaria) MANTIDA PELO ETL
+# ==============================================================================
+# Cada linha ativa da fato_midia é espalhada igualmente pelos dias de start_date a
+# end_date (net_total, total_final e periodic_impact divididos pelo nº de dias) e
+# somada por data x cliente x campanha x exibidor x mídia. O Power BI lê pronto,
+# sem diarizar em DAX.
+# Incremental: cada arquivo gravado/atualizado/inativado anota em
+# fato_midia_diaria_pendente a faixa de datas do cliente que ele ocupava antes e
+# depois (na mesma transação do arquivo). No fim da execução as faixas são unidas
+# por cliente e só esses dias são apagados e recalculados, num DELETE + um
+# INSERT ... generate_series no banco (nada linha a linha em Python).
+# Várias instâncias (--compartilhado): o recálculo é serializado por um advisory lock
+# de transação, para duas delas não apagarem/inserirem os mesmos dias ao mesmo tempo.
+
+NAMESPACE_LOCK = 7311   # par com etl_instancias.NAMESPACE_LOCK (7310 = clientes)
+
+def garantir_tabelas_diaria(engine):
+    # Devolve True se a tabela acabou de ser criada (precisa de uma carga completa)
+    with engine.begin() as conn:
+        existia = conn.execute(text("SELECT to_regclass('fato_midia_diaria') IS NOT NULL")).scalar()
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS fato_midia_diaria (
+            data DATE NOT NULL,
+            id_cliente INTEGER,
+            id_campaign INTEGER,
+            id_exibidor INTEGER,
+            id_media INTEGER,
+            net_total DOUBLE PRECISION,
+            total_final DOUBLE PRECISION,
+            periodic_impact DOUBLE PRECISION,
+            linhas INTEGER)"""))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_fato_midia_diaria_cliente_data ON fato_midia_diaria (id_cliente, data)"))
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS fato_midia_diaria_pendente (
+            id_cliente INTEGER,
+            inicio DATE,
+            fim DATE)"""))
+        # tudo = recálculo completo pedido (a tabela só é esvaziada dentro do atualizar)
+        conn.execute(text("ALTER TABLE fato_midia_diaria_pendente ADD COLUMN IF NOT EXISTS tudo BOOLEAN NOT NULL DEFAULT false"))
+    return not existia
+
+def marcar_pendente(conn, arquivos_origem):
+    # Faixa de datas (por cliente) das linhas atuais dos arquivos, ativas ou não.
+    # Chamar antes de mexer nas linhas (faixa antiga) e depois (faixa nova).
+    if not settings.MANTER_DIARIA or not arquivos_origem: return
+    conn.execute(text("""INSERT INTO fato_midia_diaria_pendente (id_cliente, inicio, fim)
+        SELECT id_cliente, MIN(start_date)::date, MAX(end_date)::date FROM fato_midia
+        WHERE arquivo_origem = ANY(:arqs) AND start_date IS NOT NULL AND end_date IS NOT NULL
+        GROUP BY id_cliente"""), {"arqs": list(arquivos_origem)})
+
+def marcar_tudo(conn):
+    # Recalcula a diária inteira (primeira criação ou --reconstruir-diaria). Só agenda:
+    # a tabela atual continua no ar para o Power BI até o atualizar do fim da execução.
+    conn.execute(text("""INSERT INTO fato_midia_diaria_pendente (id_cliente, inicio, fim, tudo)
+        SELECT id_cliente, MIN(start_date)::date, MAX(end_date)::date, true FROM fato_midia
+        WHERE is_active = true AND start_date IS NOT NULL AND end_date IS NOT NULL GROUP BY id_cliente"""))
+    # Garante o esvaziamento mesmo sem nenhuma linha ativa
+    conn.execute(text("INSERT INTO fato_midia_diaria_pendente (id_cliente, inicio, fim, tudo) VALUES (NULL, NULL, NULL, true)"))
+
+def juntar_faixas(faixas):
+    # [(cliente, inicio, fim)] -> faixas sem sobreposição por cliente (senão o INSERT somaria dias duas vezes)
+    juntas = []
+    for cliente, inicio, fim in sorted(faixas, key=lambda f: (f[0] is None, f[0] or 0, f[1])):
+        if juntas and juntas[-1][0] == cliente and inicio <= juntas[-1][2]:
+            juntas[-1][2] = max(juntas[-1][2], fim)
+        else: juntas.append([cliente, inicio, fim])
+    return [tuple(f) for f in juntas]
+
+_FAIXAS = """faixas AS (SELECT * FROM unnest(CAST(:clientes AS integer[]), CAST(:inicios AS date[]), CAST(:fins AS date[]))
+                         AS f(id_cliente, inicio, fim))"""
+
+def atualizar(conn):
+    """Recalcula os dias pendentes. Devolve (faixas, linhas gravadas)."""
+    if not settings.MANTER_DIARIA: return 0, 0
+    conn.execute(text("SELECT pg_advisory_xact_lock(:ns, 0)"), {"ns": NAMESPACE_LOCK})
+    pendentes = conn.execute(text("DELETE FROM fato_midia_diaria_pendente RETURNING id_cliente, inicio, fim, tudo")).fetchall()
+    faixas = juntar_faixas([tuple(p[:3]) for p in pendentes if p[1] is not None and p[2] is not None])
+    # Recálculo completo: esvazia na mesma transação do INSERT, quem lê vê a tabela antiga ou a nova
+    if any(p[3] for p in pendentes): conn.execute(text("DELETE FROM fato_midia_diaria"))
+    if not faixas: return 0, 0
+    params = {"clientes": [f[0] for f in faixas], "inicios": [f[1] for f in faixas], "fins": [f[2] for f in faixas]}
+
+    conn.execute(text(f"""WITH {_FAIXAS}
+        DELETE FROM fato_midia_diaria d USING faixas f
+        WHERE d.id_cliente IS NOT DISTINCT FROM f.id_cliente AND d.data BETWEEN f.inicio AND f.fim"""), params)
+    linhas = conn.execute(text(f"""WITH {_FAIXAS},
+        linhas AS (
+            SELECT m.id_cliente, m.id_campaign, m.id_exibidor, m.id_media, m.net_total, m.total_final, m.periodic_impact,
+                   m.start_date::date AS inicio, m.end_date::date AS fim,
+                   (m.end_date::date - m.start_date::date + 1) AS dias, f.inicio AS faixa_inicio, f.fim AS faixa_fim
+            FROM fato_midia m JOIN faixas f ON m.id_cliente IS NOT DISTINCT FROM f.id_cliente
+            WHERE m.is_active = true AND m.end_date::date >= m.start_date::date
+              AND m.start_date::date <= f.fim AND m.end_date::date >= f.inicio)
+        INSERT INTO fato_midia_diaria (data, id_cliente, id_campaign, id_exibidor, id_media, net_total, total_final, periodic_impact, linhas)
+        SELECT dia::date, l.id_cliente, l.id_campaign, l.id_exibidor, l.id_media,
+               SUM(l.net_total / l.dias), SUM(l.total_final / l.dias), SUM(l.periodic_impact / l.dias), COUNT(*)
+        FROM linhas l
+        CROSS JOIN LATERAL generate_series(GREATEST(l.inicio, l.faixa_inicio), LEAST(l.fim, l.faixa_fim), interval '1 day') AS dia
+        GROUP BY 1, 2, 3, 4, 5"""), params).rowcount
+    return len(faixas), linhas
@@ -0,0 +1,119 @@
+import os
+import pickle
+import hashlib
+from contextlib import nullcontext
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+import pandas as pd
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# SNAPSHOT LOCAL DAS DIMENSÕES E ALIASES (PARTIDA INCREMENTAL DO ETL)
+# ==============================================================================
+# Os dicts de gabarito/alias ficam num pickle em PASTA_CACHE/dimensoes/ (um por banco;
+# subpasta para ficar fora da poda por tamanho do etl_cache.podar). Na
+# partida, uma consulta barata por tabela devolve a contagem até a marca d'água
+# (maior id) do snapshot, o maior id e os contadores de UPDATE/DELETE do Postgres
+# (pg_stat_user_tables; o ETL só insere nessas tabelas):
+#   * contagem e contadores iguais ao snapshot -> só as linhas com id acima da
+#     marca vêm do banco
+#   * diferentes (alguém editou/apagou linhas à mão, estatísticas zeradas) ->
+#     recarga completa daquela tabela
+# Se a consulta falhar, fica o que está no snapshot (com aviso).
+# As tabelas mapa_*_alias não tinham id: ganham id_alias BIGSERIAL (garantir_id_alias).
+
+VERSAO_SNAPSHOT = 2
+DIMENSOES_COM_ALIAS = ['exibidor', 'media', 'campaign', 'target']
+DIMENSOES_SIMPLES = ['cliente', 'classification', 'display_type']
+
+def tabelas_snapshot():
+    # tabela -> (coluna de id crescente, coluna de texto, coluna do id gravado no mapa)
+    tabelas = {f"dim_{d}": (f"id_{d}", 'nome_oficial', f"id_{d}") for d in DIMENSOES_COM_ALIAS + DIMENSOES_SIMPLES}
+    tabelas.update({f"mapa_{d}_alias": ('id_alias', 'alias_sujo', f"id_{d}_fk") for d in DIMENSOES_COM_ALIAS})
+    return tabelas
+
+def garantir_id_alias(engine):
+    for dim in DIMENSOES_COM_ALIAS:
+        try:
+            with engine.begin() as conn:
+                existe = conn.execute(text("SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :t AND column_name = 'id_alias'"),
+                                      {"t": f"mapa_{dim}_alias"}).scalar()
+                if not existe: conn.execute(text(f"ALTER TABLE mapa_{dim}_alias ADD COLUMN id_alias BIGSERIAL"))
+        except Exception as e: print(f"   -> [AVISO] mapa_{dim}_alias sem id_alias ({e}).")
+
+
+# --- ARQUIVO DO SNAPSHOT ---
+def _arquivo(conexao):
+    # Um snapshot por banco (URL sem senha)
+    url = conexao.url if isinstance(conexao, Engine) else conexao.engine.url
+    chave = hashlib.sha1(url.render_as_string(hide_password=True).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(settings.PASTA_CACHE, 'dimensoes', f"{chave}.pkl")
+
+def _ler_snapshot(caminho):
+    try:
+        with open(caminho, 'rb') as f: snapshot = pickle.load(f)
+        return snapshot['tabelas'] if snapshot.get('versao') == VERSAO_SNAPSHOT else {}
+    except Exception: return {}
+
+def _gravar_snapshot(caminho, tabelas):
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as f: pickle.dump({'versao': VERSAO_SNAPSHOT, 'tabelas': tabelas}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+    except Exception as e: print(f"   -> [AVISO] Snapshot das dimensões não gravado ({e}).")
+
+
+# --- ATUALIZAÇÃO DE CADA TABELA ---
+def _estado(conn, tabela, col_id, marca):
+    # (contagem até a marca, maior id, updates, deletes): sem ler o conteúdo das linhas
+    sql = text(f"""SELECT COUNT(*) FILTER (WHERE {col_id} <= :marca), MAX({col_id}),
+                          (SELECT n_tup_upd FROM pg_stat_user_tables WHERE relid = to_regclass(:t)),
+                          (SELECT n_tup_del FROM pg_stat_user_tables WHERE relid = to_regclass(:t))
+                   FROM {tabela}""")
+    return conn.execute(sql, {"marca": marca, "t": tabela}).one()
+
+def _aplicar(entrada, df, col_texto, col_valor):
+    # Mesma montagem do carregar_mapas antigo; em ordem de id, o mais novo vence
+    chaves = df[col_texto].str.strip(); valores = df[col_valor].tolist()
+    entrada['oficial'].update(zip(chaves, valores))
+    entrada['upper'].update(zip(chaves.str.upper(), valores))
+
+def _atualizar_tabela(conn, tabela, entrada):
+    col_id, col_texto, col_valor = tabelas_snapshot()[tabela]
+    marca = entrada['marca'] if entrada else -1
+    contagem_ate, maximo, atualizadas, apagadas = _estado(conn, tabela, col_id, marca)
+
+    if entrada and (contagem_ate, atualizadas, apagadas) == (entrada['contagem'], entrada['atualizadas'], entrada['apagadas']):
+        modo = 'incremental' if maximo is not None and maximo > marca else 'cache'
+    else:
+        entrada = {'oficial': {}, 'upper': {}}; marca = -1; modo = 'completo'; contagem_ate = 0
+    contagem = contagem_ate
+    if modo != 'cache':
+        df = pd.read_sql(text(f"SELECT {col_texto}, {col_valor} FROM {tabela} WHERE {col_id} > :marca AND {col_id} <= :maximo ORDER BY {col_id}"),
+                         conn, params={"marca": marca, "maximo": maximo if maximo is not None else -1})
+        _aplicar(entrada, df, col_texto, col_valor); contagem += len(df)
+    entrada.update(marca=maximo if maximo is not None else -1, contagem=contagem, atualizadas=atualizadas, apagadas=apagadas)
+    return entrada, modo
+
+def carregar(conexao):
+    """{tabela: {'oficial': {nome: id}, 'upper': {NOME: id}}} a partir do snapshot + banco.
+    Tabela que falhou fica com o snapshot; sem snapshot (ex.: não existe) fica de fora
+    (o carregar_mapas usa dict vazio)."""
+    caminho = _arquivo(conexao)
+    snapshot = _ler_snapshot(caminho); resultado = {}; modos = {}
+    with (conexao.connect() if isinstance(conexao, Engine) else nullcontext(conexao)) as conn:
+        for tabela in tabelas_snapshot():
+            try:
+                # SAVEPOINT: uma tabela ausente não derruba a transação de quem chamou
+                with conn.begin_nested():
+                    resultado[tabela], modo = _atualizar_tabela(conn, tabela, snapshot.get(tabela))
+                modos[modo] = modos.get(modo, 0) + 1
+            except Exception as e:
+                if tabela in snapshot:
+                    resultado[tabela] = snapshot[tabela]; modos['snapshot'] = modos.get('snapshot', 0) + 1
+                    print(f"   -> [AVISO] {tabela} não consultada ({e}); usando o snapshot.")
+        if isinstance(conexao, Engine): conn.commit()
+    if modos.get('incremental') or modos.get('completo') or len(resultado) != len(snapshot): _gravar_snapshot(caminho, resultado)
+    print(f"   -> Snapshot das dimensões: {', '.join(f'{n} {m}' for m, n in sorted(modos.items()))}.")
+    return resultado
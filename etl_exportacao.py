@@ -0,0 +1,144 @@
+import os
+import shutil
+import pandas as pd
+from sqlalchemy import text
+import etl_dimensoes
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# EXPORTAÇÃO EM PARQUET PARA O POWER BI (PASTA_EXPORTACAO)
+# ==============================================================================
+# Layout (partições no padrão hive, lido direto por pyarrow/duckdb/Power BI):
+#   <PASTA_EXPORTACAO>/fato_midia/id_cliente=<id>/mes=<AAAA-MM>/dados.parquet
+#   <PASTA_EXPORTACAO>/dimensoes/dim_<nome>.parquet
+# Só linhas ativas; o mês é o da start_date. Sem cliente/data a partição vira
+# __HIVE_DEFAULT_PARTITION__ (lido como nulo).
+# Incremental: como na fato_midia_diaria, cada arquivo gravado/atualizado/inativado
+# anota em fato_midia_exportar_pendente os (cliente, mês) que ocupava antes e depois,
+# na mesma transação. No fim da execução só essas partições são regravadas; partição
+# que ficou sem linhas ativas é apagada. As dimensões são pequenas e vão inteiras.
+# Esquema: todo arquivo é gravado com o esquema Arrow montado dos tipos da tabela no
+# banco (information_schema), nunca com o que o read_sql inferiu da fatia: coluna toda
+# nula num cliente ou inteiro com nulo (float) quebrariam a leitura da pasta como dataset.
+
+PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+NAMESPACE_LOCK = 7312   # par com etl_instancias (7310) e etl_diaria (7311)
+
+def ativa():
+    if not settings.PASTA_EXPORTACAO: return False
+    try: import pyarrow  # noqa: F401
+    except ImportError:
+        print("-> [AVISO] pyarrow não instalado. Exportação Parquet desligada."); settings.PASTA_EXPORTACAO = None
+        return False
+    return True
+
+def garantir_tabela_exportacao(engine):
+    # Devolve True se é preciso exportar tudo (tabela nova ou pasta de exportação apagada)
+    with engine.begin() as conn:
+        existia = conn.execute(text("SELECT to_regclass('fato_midia_exportar_pendente') IS NOT NULL")).scalar()
+        conn.execute(text("CREATE TABLE IF NOT EXISTS fato_midia_exportar_pendente (id_cliente INTEGER, mes DATE)"))
+    return not existia or not os.path.isdir(os.path.join(settings.PASTA_EXPORTACAO, 'fato_midia'))
+
+def marcar_pendente(conn, arquivos_origem):
+    # Partições (cliente, mês) das linhas atuais dos arquivos. Chamar antes e depois de mexer nelas.
+    if not settings.PASTA_EXPORTACAO or not arquivos_origem: return
+    conn.execute(text("""INSERT INTO fato_midia_exportar_pendente (id_cliente, mes)
+        SELECT DISTINCT id_cliente, date_trunc('month', start_date)::date FROM fato_midia
+        WHERE arquivo_origem = ANY(:arqs)"""), {"arqs": list(arquivos_origem)})
+
+def marcar_tudo(conn):
+    # Inclui partições só com linhas inativas: são regravadas vazias, ou seja, apagadas
+    conn.execute(text("""INSERT INTO fato_midia_exportar_pendente (id_cliente, mes)
+        SELECT DISTINCT id_cliente, date_trunc('month', start_date)::date FROM fato_midia"""))
+
+
+# --- ESQUEMA ---
+def _tipos_arrow():
+    import pyarrow as pa
+    return {'smallint': pa.int16(), 'integer': pa.int32(), 'bigint': pa.int64(), 'real': pa.float32(),
+            'double precision': pa.float64(), 'numeric': pa.float64(), 'boolean': pa.bool_(), 'date': pa.date32(),
+            'timestamp without time zone': pa.timestamp('us'), 'timestamp with time zone': pa.timestamp('us', tz='UTC')}
+
+def esquema_arrow(conn, tabela, sem=()):
+    # Tipo do banco -> tipo Arrow; o resto (text, varchar...) vira string
+    import pyarrow as pa
+    tipos = _tipos_arrow()
+    colunas = conn.execute(text("""SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :t ORDER BY ordinal_position"""), {"t": tabela}).fetchall()
+    return pa.schema([pa.field(nome, tipos.get(tipo, pa.string())) for nome, tipo in colunas if nome not in sem])
+
+def _nulos(serie):
+    return serie.astype(object).where(serie.notna(), None)
+
+def _tabela_arrow(df, esquema):
+    # Converte coluna a coluna para o tipo do esquema antes do from_pandas
+    import pyarrow as pa
+    colunas = {}
+    for campo in esquema:
+        serie = df[campo.name] if campo.name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        tipo = campo.type
+        if pa.types.is_integer(tipo): serie = pd.to_numeric(serie, errors='coerce').astype('Int64')
+        elif pa.types.is_floating(tipo): serie = pd.to_numeric(serie, errors='coerce').astype('float64')
+        elif pa.types.is_date(tipo): serie = _nulos(pd.to_datetime(serie, errors='coerce').dt.date)
+        elif pa.types.is_timestamp(tipo): serie = pd.to_datetime(serie, errors='coerce', utc=tipo.tz is not None)
+        elif pa.types.is_boolean(tipo): serie = _nulos(serie)
+        else: serie = _nulos(serie).map(lambda v: v if v is None else str(v))
+        colunas[campo.name] = serie
+    return pa.Table.from_pandas(pd.DataFrame(colunas, index=df.index), schema=esquema, preserve_index=False)
+
+
+# --- GRAVAÇÃO ---
+def _pasta_particao(cliente, mes):
+    return os.path.join(settings.PASTA_EXPORTACAO, 'fato_midia',
+                        f"id_cliente={PARTICAO_NULA if cliente is None else cliente}",
+                        f"mes={PARTICAO_NULA if mes is None else mes.strftime('%Y-%m')}")
+
+def _gravar_parquet(df, caminho, esquema):
+    # Temporário + os.replace: quem estiver lendo nunca pega um arquivo pela metade
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    pq.write_table(_tabela_arrow(df, esquema), temporario)
+    os.replace(temporario, caminho)
+
+def _exportar_cliente(conn, cliente, meses, esquema):
+    # Uma leitura por cliente para todos os meses pendentes dele
+    sem_data = None in meses
+    df = pd.read_sql(text("""SELECT *, date_trunc('month', start_date)::date AS _mes FROM fato_midia
+        WHERE is_active = true AND id_cliente IS NOT DISTINCT FROM :cliente
+          AND (date_trunc('month', start_date)::date = ANY(CAST(:meses AS date[])) OR (:sem_data AND start_date IS NULL))"""),
+                     conn, params={"cliente": cliente, "meses": [m for m in meses if m is not None], "sem_data": sem_data})
+    # Colunas de partição ficam só no caminho (senão o leitor hive acha a coluna duas vezes)
+    meses_df = pd.to_datetime(df.pop('_mes')).dt.date; df = df.drop(columns=['id_cliente'])
+    linhas = 0
+    for mes in meses:
+        parte = df[meses_df.isna()] if mes is None else df[meses_df == mes]
+        pasta = _pasta_particao(cliente, mes)
+        if parte.empty: shutil.rmtree(pasta, ignore_errors=True); continue
+        _gravar_parquet(parte, os.path.join(pasta, 'dados.parquet'), esquema); linhas += len(parte)
+    return linhas
+
+def _exportar_dimensoes(conn):
+    for dim in etl_dimensoes.DIMENSOES_COM_ALIAS + etl_dimensoes.DIMENSOES_SIMPLES:
+        try:
+            with conn.begin_nested():
+                df = pd.read_sql(text(f"SELECT * FROM dim_{dim} ORDER BY id_{dim}"), conn); esquema = esquema_arrow(conn, f"dim_{dim}")
+            _gravar_parquet(df, os.path.join(settings.PASTA_EXPORTACAO, 'dimensoes', f"dim_{dim}.parquet"), esquema)
+        except Exception as e: print(f"   -> [AVISO] dim_{dim} não exportada ({e}).")
+
+def exportar(conn):
+    """Regrava as partições pendentes e as dimensões. Devolve (partições, linhas)."""
+    if not settings.PASTA_EXPORTACAO: return 0, 0
+    # Várias instâncias (--compartilhado) não regravam a mesma partição ao mesmo tempo
+    conn.execute(text("SELECT pg_advisory_xact_lock(:ns, 0)"), {"ns": NAMESPACE_LOCK})
+    pendentes = set(conn.execute(text("DELETE FROM fato_midia_exportar_pendente RETURNING id_cliente, mes")).fetchall())
+    por_cliente = {}
+    for cliente, mes in pendentes: por_cliente.setdefault(cliente, set()).add(mes)
+
+    linhas = 0
+    # id_cliente fica só no caminho da partição
+    esquema = esquema_arrow(conn, 'fato_midia', sem=('id_cliente',)) if por_cliente else None
+    for cliente, meses in por_cliente.items(): linhas += _exportar_cliente(conn, cliente, sorted(meses, key=lambda m: (m is None, m)), esquema)
+    # Nome novo em dimensão só aparece junto com arquivo alterado; sem pendentes, só se a pasta sumiu
+    if pendentes or not os.path.isdir(os.path.join(settings.PASTA_EXPORTACAO, 'dimensoes')): _exportar_dimensoes(conn)
+    return len(pendentes), linhas
@@ -0,0 +1,76 @@
+from collections import defaultdict
+from rapidfuzz import fuzz, process, utils
+
+# ==============================================================================
+# ÍNDICE FUZZY DOS GABARITOS (exibidor / media / campaign / target)
+# ==============================================================================
+# Reproduz exatamente o process.extractOne(..., scorer=fuzz.token_sort_ratio) do
+# thefuzz com corte >= 90, mas sem varrer o gabarito inteiro a cada alias novo:
+#   * os nomes oficiais ficam pré-processados e com os tokens já ordenados;
+#   * um índice por tamanho descarta quem não tem como chegar ao corte;
+#   * o RapidFuzz pontua só os candidatos que sobraram.
+#
+# Detalhes de compatibilidade com o thefuzz 0.22:
+#   * a consulta passa por full_process duas vezes (a segunda com force_ascii) e as
+#     escolhas só pela segunda; force_ascii remove (não translitera) os chars 128-255;
+#   * o score é arredondado com round() antes do ">= 90", então o corte real é 89.5;
+#   * em empate vence o primeiro nome na ordem do gabarito.
+
+CORTE_FUZZY = 89.5
+
+_TABELA_ASCII = {i: None for i in range(128, 256)}
+
+def _processar_escolha(texto):
+    return ' '.join(sorted(utils.default_process(str(texto).translate(_TABELA_ASCII)).split()))
+
+def _processar_consulta(texto):
+    return _processar_escolha(utils.default_process(str(texto)))
+
+def _pode_atingir_corte(tamanho_a, tamanho_b, corte):
+    # ratio = 100 * (1 - indel / (a + b)) e indel >= |a - b|, logo o teto é 200 * min / (a + b)
+    if tamanho_a + tamanho_b == 0: return True
+    return 200.0 * min(tamanho_a, tamanho_b) / (tamanho_a + tamanho_b) >= corte
+
+
+class IndiceFuzzy:
+    """Casamento fuzzy de um gabarito (nome_oficial -> id), atualizado a cada nome novo."""
+
+    def __init__(self, gabarito_dict, corte=CORTE_FUZZY):
+        self.gabarito = gabarito_dict
+        self.corte = corte
+        self._nomes = []; self._processados = []; self._posicao = {}
+        self._por_tamanho = defaultdict(list)
+        for nome in gabarito_dict: self.indexar(nome)
+
+    def __len__(self): return len(self._posicao)
+
+    def indexar(self, nome):
+        # Entra como candidato (na ordem de chegada); o id pode vir depois via adicionar().
+        if nome in self._posicao: return
+        processado = _processar_escolha(nome)
+        self._posicao[nome] = len(self._nomes)
+        self._por_tamanho[len(processado)].append(len(self._nomes))
+        self._nomes.append(nome); self._processados.append(processado)
+
+    def adicionar(self, nome, id_oficial):
+        self.gabarito[nome] = id_oficial
+        self.indexar(nome)
+
+    def remover(self, nome):
+        # Usado quando o INSERT do nome novo falha: tira o candidato sem mexer na ordem dos demais.
+        posicao = self._posicao.pop(nome, None)
+        if posicao is None: return
+        self._por_tamanho[len(self._processados[posicao])].remove(posicao)
+        self._processados[posicao] = None
+
+    def melhor(self, texto):
+        """Nome oficial com maior token_sort_ratio >= corte, ou None."""
+        consulta = _processar_consulta(texto)
+        tamanho = len(consulta)
+        posicoes = sorted(p for t, lista in self._por_tamanho.items()
+                          if lista and _pode_atingir_corte(tamanho, t, self.corte) for p in lista)
+        if not posicoes: return None
+        match = process.extractOne(consulta, [self._processados[p] for p in posicoes],
+                                   scorer=fuzz.ratio, processor=None, score_cutoff=self.corte)
+        if match is None: return None
+        return self._nomes[posicoes[match[2]]]
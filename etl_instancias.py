@@ -0,0 +1,48 @@
+import os
+import socket
+from sqlalchemy import text
+
+# ==============================================================================
+# VÁRIAS INSTÂNCIAS DO ETL AO MESMO TEMPO (--compartilhado)
+# ==============================================================================
+# Cada pasta de cliente em CAMINHO_MIDIA é reivindicada com um advisory lock de
+# sessão do Postgres (pg_try_advisory_lock), numa conexão própria em autocommit que
+# fica aberta até o fim do processo. Quem pega o lock processa o cliente e faz o
+# soft delete só dele; as outras instâncias pulam para o próximo. A reivindicação é
+# feita cliente a cliente, na hora de processar: quem termina antes pega mais
+# clientes. Se a instância cair, a conexão fecha e os locks são liberados sozinhos.
+
+NAMESPACE_LOCK = 7310   # primeira chave do lock: separa os locks do ETL de outros usos
+
+
+def nome_instancia(informado=None):
+    # Padrão com o pid: duas instâncias na mesma máquina não dividem checkpoint nem .prom.
+    # Para retomar uma execução interrompida, rode sempre com o mesmo --instancia.
+    return informado or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Coordenador:
+    def __init__(self, engine, instancia=None):
+        self.instancia = nome_instancia(instancia)
+        self._conn = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        self.donos = set()
+
+    def tentar(self, cliente):
+        """True se este processo ficou (ou já estava) com o cliente."""
+        if cliente in self.donos: return True
+        obtido = self._conn.execute(text("SELECT pg_try_advisory_lock(:ns, hashtext(:cliente))"),
+                                    {"ns": NAMESPACE_LOCK, "cliente": cliente}).scalar()
+        if obtido: self.donos.add(cliente)
+        return bool(obtido)
+
+    def reivindicar_orfaos(self, conn, clientes_na_pasta):
+        # Clientes com linhas ativas na fato mas sem pasta (pasta apagada): alguém
+        # precisa inativá-los, então entram na disputa como os outros.
+        orfaos = conn.execute(text("""SELECT DISTINCT split_part(arquivo_origem, '/', 1) FROM fato_midia
+            WHERE is_active = true AND NOT (split_part(arquivo_origem, '/', 1) = ANY(:clientes))"""),
+                              {"clientes": list(clientes_na_pasta)}).scalars().all()
+        return [cliente for cliente in orfaos if self.tentar(cliente)]
+
+    def fechar(self):
+        # Fechar a conexão libera todos os locks de sessão
+        self._conn.close(); self.donos.clear()
@@ -0,0 +1,180 @@
+import os
+import time
+import heapq
+import logging
+import cProfile
+import pstats
+from collections import Counter as Contagem
+from contextlib import contextmanager
+from sqlalchemy import event
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, write_to_textfile, push_to_gateway
+from pythonjsonlogger.json import JsonFormatter
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# MÉTRICAS DA EXECUÇÃO (PROMETHEUS + LOG JSON + PERFIL DOS ARQUIVOS MAIS LENTOS)
+# ==============================================================================
+# Cada arquivo carrega um objeto Medidas com o tempo de cada etapa (leitura,
+# limpeza, normalizar_<dimensão>, carga, gravacao), linhas, round trips no banco e
+# resultado do fuzzy. A leitura/limpeza pode rodar num worker (--workers): as
+# Medidas voltam junto com o DataFrame e só o processo principal exporta.
+#   * settings.METRICAS_ARQUIVO_PROM -> textfile collector do node_exporter
+#   * settings.METRICAS_PUSHGATEWAY  -> opcional, push no fim de cada execução/lote
+#   * settings.LOG_JSON              -> uma linha JSON por arquivo e por etapa global
+#   * settings.PERFIL_TOP_N          -> cProfile por arquivo; grava os N mais lentos
+
+REGISTRO = CollectorRegistry()
+_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+DURACAO_ETAPA = Histogram('etl_midia_etapa_segundos', 'Duração de cada etapa, por arquivo ou por execução.',
+                          ['etapa'], buckets=_BUCKETS, registry=REGISTRO)
+ARQUIVOS = Counter('etl_midia_arquivos', 'Arquivos processados por status.', ['status'], registry=REGISTRO)
+LINHAS = Counter('etl_midia_linhas', 'Linhas por operação (lidas, inseridas, atualizadas, removidas, inativadas).',
+                 ['operacao'], registry=REGISTRO)
+FUZZY = Counter('etl_midia_fuzzy_valores', 'Valores únicos resolvidos por dimensão (alias, fuzzy ou novo).',
+                ['dimensao', 'resultado'], registry=REGISTRO)
+ROUND_TRIPS = Counter('etl_midia_round_trips', 'Comandos enviados ao banco (execute e lotes de COPY).', registry=REGISTRO)
+EXECUCAO_SEGUNDOS = Gauge('etl_midia_execucao_segundos', 'Duração da última execução completa.', registry=REGISTRO)
+EXECUCAO_FIM = Gauge('etl_midia_execucao_fim_timestamp', 'Fim da última execução (epoch).', registry=REGISTRO)
+ULTIMOS_ARQUIVOS = Gauge('etl_midia_execucao_arquivos', 'Arquivos da última execução por modo.', ['modo'], registry=REGISTRO)
+
+LOG = logging.getLogger('etl_midia')
+EXECUCAO = f"{int(time.time())}-{os.getpid()}"
+INSTANCIA = None   # modo --compartilhado: separa o .prom e o grupo do Pushgateway por instância
+
+_atual = None          # Medidas do arquivo sendo gravado (processo principal)
+_mais_lentos = []      # heap (duração, arquivo, perfis) com os PERFIL_TOP_N mais lentos
+
+
+class Medidas:
+    """Telemetria de um arquivo. Só dicts/números: atravessa o pool de processos."""
+
+    def __init__(self):
+        self.tempos = {}; self.fuzzy = Contagem(); self.round_trips = 0
+        self.linhas = 0; self.tocadas = {}; self.perfis = []
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try: yield
+        finally: self.tempos[nome] = self.tempos.get(nome, 0.0) + time.perf_counter() - inicio
+
+    @contextmanager
+    def perfilando(self):
+        if settings.PERFIL_TOP_N <= 0: yield; return
+        perfil = cProfile.Profile(); perfil.enable()
+        try: yield
+        finally:
+            perfil.disable(); perfil.create_stats(); self.perfis.append(perfil.stats)
+
+    def duracao(self): return sum(s for etapa, s in self.tempos.items() if etapa in ('leitura', 'limpeza', 'gravacao'))
+
+
+class _PerfilPronto:
+    # pstats.Stats aceita qualquer objeto com create_stats() + stats
+    def __init__(self, stats): self.stats = stats
+    def create_stats(self): pass
+
+
+# --- CONFIGURAÇÃO ---
+def _contar_round_trip(*args, **kwargs): contar_round_trip()
+
+def configurar(engine):
+    # Liga o contador de round trips na engine e o log JSON (uma vez por processo)
+    if not event.contains(engine, 'before_cursor_execute', _contar_round_trip):
+        event.listen(engine, 'before_cursor_execute', _contar_round_trip)
+    if settings.LOG_JSON and not LOG.handlers:
+        os.makedirs(os.path.dirname(settings.LOG_JSON) or '.', exist_ok=True)
+        handler = logging.FileHandler(settings.LOG_JSON, encoding='utf-8')
+        handler.setFormatter(JsonFormatter('%(asctime)s %(levelname)s %(message)s',
+                                           rename_fields={'asctime': 'ts', 'levelname': 'nivel', 'message': 'evento'}))
+        LOG.addHandler(handler); LOG.setLevel(logging.INFO); LOG.propagate = False
+
+def _log(evento, **campos): LOG.info(evento, extra={'execucao': EXECUCAO, **campos})
+
+
+# --- CONTADORES (CHAMADOS DE DENTRO DO ETL) ---
+def contar_round_trip(n=1):
+    ROUND_TRIPS.inc(n)
+    if _atual is not None: _atual.round_trips += n
+
+def contar_fuzzy(dimensao, resultado, n=1):
+    if n <= 0: return
+    FUZZY.labels(dimensao, resultado).inc(n)
+    if _atual is not None: _atual.fuzzy[f"{dimensao}_{resultado}"] += n
+
+@contextmanager
+def arquivo_atual(medidas):
+    global _atual
+    anterior, _atual = _atual, medidas
+    try: yield medidas
+    finally: _atual = anterior
+
+@contextmanager
+def medir(etapa, **campos):
+    # Etapas da execução que não são de um arquivo (varredura, poda de deletados...)
+    inicio = time.perf_counter()
+    try: yield campos
+    finally:
+        segundos = time.perf_counter() - inicio
+        DURACAO_ETAPA.labels(etapa).observe(segundos)
+        _log('etapa', etapa=etapa, segundos=round(segundos, 4), **campos)
+
+
+# --- FECHAMENTO DE CADA ARQUIVO ---
+def finalizar_arquivo(tarefa, medidas, status):
+    for etapa, segundos in medidas.tempos.items(): DURACAO_ETAPA.labels(etapa).observe(segundos)
+    ARQUIVOS.labels(status).inc()
+    if medidas.linhas: LINHAS.labels('lidas').inc(medidas.linhas)
+    for operacao, n in medidas.tocadas.items(): LINHAS.labels(operacao).inc(n)
+
+    duracao = medidas.duracao()
+    _log('arquivo', arquivo_origem=tarefa['arquivo_origem'], cliente=tarefa['cliente'], modo=tarefa['modo'],
+         status=status, linhas=medidas.linhas, segundos=round(duracao, 4), round_trips=medidas.round_trips,
+         tempos={etapa: round(s, 4) for etapa, s in medidas.tempos.items()}, fuzzy=dict(medidas.fuzzy), **medidas.tocadas)
+
+    if medidas.perfis and settings.PERFIL_TOP_N > 0:
+        item = (duracao, tarefa['arquivo_origem'], medidas.perfis)
+        if len(_mais_lentos) < settings.PERFIL_TOP_N: heapq.heappush(_mais_lentos, item)
+        elif duracao > _mais_lentos[0][0]: heapq.heapreplace(_mais_lentos, item)
+
+def contar_inativadas(inativados):
+    # {arquivo_origem: linhas} devolvido pela poda de deletados
+    if inativados: LINHAS.labels('inativadas').inc(sum(inativados.values()))
+
+
+# --- EXPORTAÇÃO ---
+def gravar_perfis():
+    if not _mais_lentos: return []
+    os.makedirs(settings.PASTA_PERFIS, exist_ok=True)
+    gravados = []
+    for posicao, (duracao, arquivo, perfis) in enumerate(sorted(_mais_lentos, reverse=True), 1):
+        nome = "".join(c if c.isalnum() or c in '-_.' else '_' for c in arquivo)
+        caminho = os.path.join(settings.PASTA_PERFIS, f"{posicao:02d}_{nome}.prof")
+        pstats.Stats(*[_PerfilPronto(p) for p in perfis]).dump_stats(caminho)
+        gravados.append((duracao, arquivo, caminho))
+    return gravados
+
+def exportar():
+    try:
+        if settings.METRICAS_ARQUIVO_PROM:
+            arquivo = settings.METRICAS_ARQUIVO_PROM
+            if INSTANCIA: arquivo = arquivo.replace('.prom', f"_{INSTANCIA}.prom")
+            os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+            write_to_textfile(arquivo, REGISTRO)
+        if settings.METRICAS_PUSHGATEWAY:
+            push_to_gateway(settings.METRICAS_PUSHGATEWAY, job='etl_midia', registry=REGISTRO,
+                            grouping_key={'instance': INSTANCIA} if INSTANCIA else None)
+    except Exception as e: print(f"-> [AVISO] Métricas não exportadas ({e}).")
+
+def encerrar(inicio, contador_novos, contador_atualizados, contador_ignorados):
+    # Fecha a execução: gauges, resumo no log, perfis dos mais lentos e exportação.
+    segundos = time.time() - inicio
+    EXECUCAO_SEGUNDOS.set(segundos); EXECUCAO_FIM.set_to_current_time()
+    for modo, n in (('novo', contador_novos), ('atualizado', contador_atualizados), ('ignorado', contador_ignorados)):
+        ULTIMOS_ARQUIVOS.labels(modo).set(n)
+    _log('execucao', segundos=round(segundos, 2), novos=contador_novos, atualizados=contador_atualizados, ignorados=contador_ignorados)
+    try:
+        for duracao, arquivo, caminho in gravar_perfis(): print(f"-> Perfil: {arquivo} ({duracao:.1f}s) -> {caminho}")
+    except Exception as e: print(f"-> [AVISO] Perfis não gravados ({e}).")
+    exportar()
@@ -1,10 +1,26 @@
 import pandas as pd
 import os
+import time
+import argparse
+import hashlib
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-from thefuzz import process, fuzz
 
 import etl_bradesco 
+import etl_fuzzy
+import etl_carga
+import etl_cache
+import etl_planilha
+import etl_observador
+import etl_metricas
+import etl_dimensoes
+import etl_diaria
+import etl_instancias
+import etl_exportacao
 import settings # <--- Importa as configurações
 
 # CONFIGURAÇÃO DE CLIENTES (Continua aqui pois é lógica de fluxo)
@@ -12,26 +28,31 @@ CONFIG_CLIENTES = {
     'SPORTINGBET': {'cabecalho_chave': 'CODE'},
 }
 
+# COLUNAS QUE VÃO PARA A fato_midia (na ordem da tabela)
+COLS_FINAIS = [
+    'code', 'size', 'frequency', 'period_quantity', 'insertion_faces_period', 
+    'start_date', 'end_date', 'weekly_flow', 'weekly_impact', 'periodic_impact', 
+    'faces_x_frequency', 'cpm_target', 'net_total', 'total_bonus', 'total_final',
+    'id_display_type', 'id_exibidor', 'id_campaign', 'id_target', 'id_media', 'id_cliente',
+    'arquivo_origem', 'file_timestamp', 'is_active',
+    'country', 'market', 'state', 'location', 'chave_linha'
+]
+
 # --- FUNÇÕES DE NORMALIZAÇÃO ---
 def carregar_mapas(conexao):
     print("-> Carregando mapas de normalização...")
-    mapas = {'exibidor': ({}, {}), 'media': ({}, {}), 'classification': ({}, {}),
-             'display_type': ({}, {}), 'cliente': ({}, {}), 'campaign': ({}, {}), 'target': ({}, {})}
-    def carregar(nome_dim, nome_id, tem_alias=True):
-        try:
-            g_df = pd.read_sql(f"SELECT {nome_id}, nome_oficial FROM {nome_dim}", conexao)
-            mapas[nome_dim.replace('dim_', '')][0] = dict(zip(g_df['nome_oficial'].str.strip(), g_df[nome_id]))
-            if tem_alias:
-                m_df = pd.read_sql(f"SELECT alias_sujo, {nome_id}_fk FROM mapa_{nome_dim.replace('dim_', '')}_alias", conexao)
-                mapas[nome_dim.replace('dim_', '')][1] = dict(zip(m_df['alias_sujo'].str.strip().str.upper(), m_df[f"{nome_id}_fk"]))
-            else: mapas[nome_dim.replace('dim_', '')][1] = dict(zip(g_df['nome_oficial'].str.strip().str.upper(), g_df[nome_id]))
-        except Exception: pass
-    
-    carregar('dim_exibidor', 'id_exibidor'); carregar('dim_media', 'id_media')
-    carregar('dim_campaign', 'id_campaign'); carregar('dim_target', 'id_target')
-    carregar('dim_cliente', 'id_cliente', tem_alias=False) 
-    carregar('dim_classification', 'id_classification', tem_alias=False)
-    carregar('dim_display_type', 'id_display_type', tem_alias=False)
+    mapas = {'exibidor': [{}, {}], 'media': [{}, {}], 'classification': [{}, {}],
+             'display_type': [{}, {}], 'cliente': [{}, {}], 'campaign': [{}, {}], 'target': [{}, {}]}
+    # Gabaritos e aliases vêm do snapshot local + linhas novas do banco (etl_dimensoes)
+    tabelas = etl_dimensoes.carregar(conexao)
+    for dim in etl_dimensoes.DIMENSOES_COM_ALIAS:
+        if f"dim_{dim}" in tabelas: mapas[dim][0] = tabelas[f"dim_{dim}"]['oficial']
+        if f"mapa_{dim}_alias" in tabelas: mapas[dim][1] = tabelas[f"mapa_{dim}_alias"]['upper']
+    for dim in etl_dimensoes.DIMENSOES_SIMPLES:
+        if f"dim_{dim}" in tabelas: mapas[dim][0] = tabelas[f"dim_{dim}"]['oficial']; mapas[dim][1] = tabelas[f"dim_{dim}"]['upper']
+    # Índice fuzzy montado uma vez por dimensão e mantido junto com o gabarito
+    for tipo in ['exibidor', 'media', 'campaign', 'target']:
+        mapas[tipo].append(etl_fuzzy.IndiceFuzzy(mapas[tipo][0]))
     return mapas
 
 def normalizar_dado_simples(texto_sujo, nome_dimensao, nome_id_dimensao, gabarito_dict, conexao):
@@ -44,62 +65,164 @@ def normalizar_dado_simples(texto_sujo, nome_dimensao, nome_id_dimensao, gabarit
     gabarito_dict[texto_upper] = id_novo
     return id_novo
 
-def normalizar_dado_fuzzy(texto_sujo, tipo_dimensao, gabarito_dict, mapa_alias_dict, conexao, **kwargs_extra):
-    if pd.isna(texto_sujo) or str(texto_sujo).strip() == '': return None
-    texto_sujo_str = str(texto_sujo).strip(); texto_upper = texto_sujo_str.upper()
-    if texto_upper in mapa_alias_dict: return mapa_alias_dict[texto_upper]
-    
-    if gabarito_dict: 
-        melhor_match = process.extractOne(texto_upper, gabarito_dict.keys(), scorer=fuzz.token_sort_ratio)
-        if melhor_match and melhor_match[1] >= 90:
-            nome_oficial_match = melhor_match[0]; id_limpo = gabarito_dict[nome_oficial_match]
-            sql_aprender = text(f"INSERT INTO mapa_{tipo_dimensao}_alias (alias_sujo, id_{tipo_dimensao}_fk) VALUES (:sujo, :id) ON CONFLICT (alias_sujo) DO NOTHING")
-            conexao.execute(sql_aprender, {"sujo": texto_sujo_str, "id": id_limpo}) 
-            mapa_alias_dict[texto_upper] = id_limpo
-            return id_limpo
-
-    params = {"nome": texto_sujo_str}; coluna_fk, valor_fk = "", ""
-    if tipo_dimensao == 'media' and 'id_classification_fk' in kwargs_extra:
-        id_class_fk = kwargs_extra['id_classification_fk']
-        if pd.notna(id_class_fk): coluna_fk = ", id_classification_fk"; valor_fk = ", :id_class_fk"; params['id_class_fk'] = int(id_class_fk) 
-
-    sql_novo_gabarito = text(f"INSERT INTO dim_{tipo_dimensao} (nome_oficial {coluna_fk}) VALUES (:nome {valor_fk}) ON CONFLICT (nome_oficial) DO NOTHING RETURNING id_{tipo_dimensao}")
-    id_novo = conexao.execute(sql_novo_gabarito, params).scalar() 
-    if id_novo is None: id_novo = conexao.execute(text(f"SELECT id_{tipo_dimensao} FROM dim_{tipo_dimensao} WHERE nome_oficial = :nome"), {"nome": texto_sujo_str}).scalar()
-    sql_novo_alias = text(f"INSERT INTO mapa_{tipo_dimensao}_alias (alias_sujo, id_{tipo_dimensao}_fk) VALUES (:sujo, :id) ON CONFLICT (alias_sujo) DO NOTHING")
-    conexao.execute(sql_novo_alias, {"sujo": texto_sujo_str, "id": id_novo})
-    gabarito_dict[texto_sujo_str] = id_novo; mapa_alias_dict[texto_upper] = id_novo
-    return id_novo
+# --- NORMALIZAÇÃO EM LOTE (POR VALOR ÚNICO DA COLUNA) ---
+def _valores_unicos(serie):
+    # Devolve (texto limpo por linha, texto upper por linha, primeira ocorrência de cada upper).
+    # Vazios/NaN ficam de fora e viram None no resultado.
+    validos = serie[serie.notna()].astype(str).str.strip()
+    validos = validos[validos != '']
+    uppers = validos.str.upper()
+    return validos, uppers, uppers.drop_duplicates()
+
+def _inserir_nomes_oficiais(conexao, nome_dimensao, nome_id_dimensao, nomes, fks_classification=None):
+    # Um INSERT multi-linha + (se algum já existia) um SELECT. Devolve {nome_oficial: id}.
+    # Nomes em ordem: instâncias concorrentes travam as chaves na mesma ordem (sem deadlock).
+    ordem = sorted(range(len(nomes)), key=nomes.__getitem__)
+    nomes = [nomes[i] for i in ordem]
+    if fks_classification is not None: fks_classification = [fks_classification[i] for i in ordem]
+    if fks_classification is None:
+        sql_novo = text(f"INSERT INTO {nome_dimensao} (nome_oficial) SELECT unnest(CAST(:nomes AS text[])) "
+                        f"ON CONFLICT (nome_oficial) DO NOTHING RETURNING {nome_id_dimensao}, nome_oficial")
+        params = {"nomes": nomes}
+    else:
+        sql_novo = text(f"INSERT INTO {nome_dimensao} (nome_oficial, id_classification_fk) "
+                        f"SELECT * FROM unnest(CAST(:nomes AS text[]), CAST(:fks AS bigint[])) "
+                        f"ON CONFLICT (nome_oficial) DO NOTHING RETURNING {nome_id_dimensao}, nome_oficial")
+        params = {"nomes": nomes, "fks": fks_classification}
+    ids = {nome: id_novo for id_novo, nome in conexao.execute(sql_novo, params)}
+    faltantes = [n for n in nomes if n not in ids]
+    if faltantes:
+        sql_existentes = text(f"SELECT {nome_id_dimensao}, nome_oficial FROM {nome_dimensao} WHERE nome_oficial = ANY(:nomes)")
+        ids.update({nome: id_existente for id_existente, nome in conexao.execute(sql_existentes, {"nomes": faltantes})})
+    return ids
+
+def normalizar_coluna_simples(serie, nome_dimensao, nome_id_dimensao, gabarito_dict, conexao):
+    validos, uppers, primeiros = _valores_unicos(serie)
+    faltantes = {upper: validos[idx] for idx, upper in primeiros.items() if upper not in gabarito_dict}
+    if faltantes:
+        ids = _inserir_nomes_oficiais(conexao, nome_dimensao, nome_id_dimensao, list(faltantes.values()))
+        for upper, nome in faltantes.items(): gabarito_dict[upper] = ids.get(nome)
+    return uppers.map(gabarito_dict).reindex(serie.index)
+
+def normalizar_coluna_fuzzy(serie, tipo_dimensao, indice_fuzzy, mapa_alias_dict, conexao, serie_classification=None):
+    # Mesma regra do antigo normalizar_dado_fuzzy (alias -> fuzzy >= 90 -> novo gabarito),
+    # aplicada aos valores únicos na ordem em que aparecem. Os nomes novos entram na
+    # lista de candidatos do fuzzy assim que surgem, como acontecia linha a linha;
+    # só o SQL é adiado para o fim (um INSERT de gabaritos + um de aliases).
+    validos, uppers, primeiros = _valores_unicos(serie)
+    gabarito_dict = indice_fuzzy.gabarito
+    novos_nomes = {}   # nome_oficial novo -> fk de classification (só media)
+    novos_alias = {}   # alias_sujo -> id existente ou nome_oficial novo
+    resolvidos = {}    # upper -> id existente ou nome_oficial novo
+
+    contagem = {'alias': 0, 'fuzzy': 0, 'novo': 0}
+
+    for idx, texto_upper in primeiros.items():
+        if texto_upper in mapa_alias_dict:
+            resolvidos[texto_upper] = mapa_alias_dict[texto_upper]; contagem['alias'] += 1; continue
+        texto_sujo_str = validos[idx]
+
+        nome_oficial_match = indice_fuzzy.melhor(texto_upper)
+        if nome_oficial_match is not None:
+            alvo = nome_oficial_match if nome_oficial_match in novos_nomes else gabarito_dict[nome_oficial_match]
+            novos_alias[texto_sujo_str] = alvo; resolvidos[texto_upper] = alvo; contagem['fuzzy'] += 1
+            continue
+
+        id_class_fk = serie_classification.get(idx) if serie_classification is not None else None
+        novos_nomes[texto_sujo_str] = int(id_class_fk) if pd.notna(id_class_fk) else None
+        novos_alias[texto_sujo_str] = texto_sujo_str; resolvidos[texto_upper] = texto_sujo_str; contagem['novo'] += 1
+        indice_fuzzy.indexar(texto_sujo_str)
+
+    ids_novos = {}
+    if novos_nomes:
+        fks = list(novos_nomes.values()) if tipo_dimensao == 'media' and serie_classification is not None else None
+        try: ids_novos = _inserir_nomes_oficiais(conexao, f"dim_{tipo_dimensao}", f"id_{tipo_dimensao}", list(novos_nomes.keys()), fks)
+        except Exception:
+            for nome in novos_nomes: indice_fuzzy.remover(nome)
+            raise
+        for nome in novos_nomes: indice_fuzzy.adicionar(nome, ids_novos.get(nome))
+
+    def _id(alvo): return ids_novos.get(alvo) if isinstance(alvo, str) else alvo
+    if novos_alias:
+        sujos = sorted(novos_alias); ids = [int(_id(novos_alias[sujo])) for sujo in sujos]
+        sql_alias = text(f"INSERT INTO mapa_{tipo_dimensao}_alias (alias_sujo, id_{tipo_dimensao}_fk) "
+                         f"SELECT * FROM unnest(CAST(:sujos AS text[]), CAST(:ids AS bigint[])) ON CONFLICT (alias_sujo) DO NOTHING")
+        conexao.execute(sql_alias, {"sujos": sujos, "ids": ids})
+    for texto_upper, alvo in resolvidos.items(): mapa_alias_dict[texto_upper] = _id(alvo)
+    for resultado, n in contagem.items(): etl_metricas.contar_fuzzy(tipo_dimensao, resultado, n)
 
-def ler_plano_padrao(caminho_completo):
+    return uppers.map(mapa_alias_dict).reindex(serie.index)
+
+def _eh_cabecalho_padrao(valores):
+    # Usa chave do settings
+    return any(settings.PALAVRA_CHAVE_PADRAO in str(c).strip().upper() for c in valores[:10])
+
+def _coluna_code_padrao(cabecalho):
+    nomes = [str(c).replace('\n', ' ').strip().lower() for c in cabecalho]
+    for sinonimo in settings.SINONIMOS_COLUNAS_PADRAO['code']:
+        match = next((i for i, c in enumerate(nomes) if sinonimo in c), None)
+        if match is not None: return match
+    return None
+
+# Para de ler a aba no primeiro TOTAL da coluna 'code' (o mesmo corte que limpar_plano faz)
+LIMITE_PADRAO = etl_planilha.LimiteTotal(
+    f"code|{settings.PALAVRA_CHAVE_PADRAO}|{settings.SINONIMOS_COLUNAS_PADRAO['code']}",
+    _eh_cabecalho_padrao, _coluna_code_padrao)
+
+def _promover_padrao(df_bruto, linha_cabecalho):
+    df_sujo = etl_planilha.promover_cabecalho(df_bruto, linha_cabecalho)
+    df_sujo.columns = df_sujo.columns.astype(str).str.replace('\n', ' ').str.strip().str.lower()
+    return df_sujo
+
+def _mapear_colunas_padrao(colunas):
+    # {coluna do banco: coluna do Excel ou None}, primeiro sinônimo que aparece contido no nome
+    mapeamento = {}
+    # Usa lista do settings
+    for col_sql, lista_sinonimos in settings.SINONIMOS_COLUNAS_PADRAO.items():
+        match_coluna_excel = None
+        for sinonimo in lista_sinonimos:
+            match = next((c for c in colunas if sinonimo in c), None)
+            if match: match_coluna_excel = match; break
+        mapeamento[col_sql] = match_coluna_excel
+    return mapeamento
+
+def _layout_conhecido_padrao(planilha):
+    # Modelo já visto (mesmas abas, cabeçalho igual na mesma linha) -> (df_sujo, mapeamento)
+    for layout in etl_cache.layouts_conhecidos('padrao', planilha.sheet_names):
+        df_bruto = planilha.aba(layout['aba'], limite=LIMITE_PADRAO)
+        linha = layout['linha']
+        if linha >= len(df_bruto) or not _eh_cabecalho_padrao(df_bruto.iloc[linha].tolist()): continue
+        df_sujo = _promover_padrao(df_bruto, linha)
+        if list(df_sujo.columns) == layout['cabecalho']: return df_sujo, layout['colunas']
+    return None, None
+
+def ler_plano_padrao(caminho_completo, planilha=None):
     try:
-        xls = pd.ExcelFile(caminho_completo)
-        aba_alvo = None
-        # Usa lista do settings
-        for aba in xls.sheet_names:
-            if any(s in aba.lower().strip() for s in settings.SINONIMOS_ABAS_PADRAO):
-                aba_alvo = aba; break
-        if not aba_alvo: return None, f"Aba padrão não encontrada."
-        
-        df_head = pd.read_excel(xls, sheet_name=aba_alvo, header=None, nrows=30)
-        linha_cabecalho = -1
-        for i, row in df_head.iterrows():
-            # Usa chave do settings
-            if any(settings.PALAVRA_CHAVE_PADRAO in str(c).strip().upper() for c in row[:10]):
-                linha_cabecalho = i; break
-        if linha_cabecalho == -1: return None, f"Cabeçalho '{settings.PALAVRA_CHAVE_PADRAO}' não encontrado."
-
-        df_sujo = pd.read_excel(xls, sheet_name=aba_alvo, header=linha_cabecalho)
-        df_sujo.columns = df_sujo.columns.astype(str).str.replace('\n', ' ').str.strip().str.lower()
+        if planilha is None: planilha = etl_planilha.PlanilhaBruta(caminho_completo)
+        df_sujo, mapeamento = _layout_conhecido_padrao(planilha)
+
+        if df_sujo is None:
+            aba_alvo = None
+            # Usa lista do settings
+            for aba in planilha.sheet_names:
+                if any(s in aba.lower().strip() for s in settings.SINONIMOS_ABAS_PADRAO):
+                    aba_alvo = aba; break
+            if not aba_alvo: return None, f"Aba padrão não encontrada."
+            
+            df_bruto = planilha.aba(aba_alvo, limite=LIMITE_PADRAO)
+            linha_cabecalho = -1
+            for i, row in df_bruto.head(etl_planilha.LINHAS_BUSCA_CABECALHO).iterrows():
+                if _eh_cabecalho_padrao(row.tolist()):
+                    linha_cabecalho = i; break
+            if linha_cabecalho == -1: return None, f"Cabeçalho '{settings.PALAVRA_CHAVE_PADRAO}' não encontrado."
+
+            df_sujo = _promover_padrao(df_bruto, linha_cabecalho)
+            mapeamento = _mapear_colunas_padrao(df_sujo.columns)
+            etl_cache.lembrar_layout('padrao', planilha.sheet_names, {'aba': aba_alvo, 'linha': int(linha_cabecalho),
+                                                                      'cabecalho': list(df_sujo.columns), 'colunas': mapeamento})
         
         df_limpo = pd.DataFrame()
-        # Usa lista do settings
-        for col_sql, lista_sinonimos in settings.SINONIMOS_COLUNAS_PADRAO.items():
-            match_coluna_excel = None
-            for sinonimo in lista_sinonimos:
-                match = next((c for c in df_sujo.columns if sinonimo in c), None)
-                if match: match_coluna_excel = match; break
-            
+        for col_sql, match_coluna_excel in mapeamento.items():
             if match_coluna_excel: df_limpo[col_sql] = df_sujo[match_coluna_excel]
             else: df_limpo[col_sql] = None
             
@@ -107,43 +230,272 @@ def ler_plano_padrao(caminho_completo):
     except Exception as e: return None, str(e)
 
 
-# --- SCRIPT PRINCIPAL ---
-load_dotenv()
-print("\n--- INICIANDO ETL v11.0 (SETTINGS SEPARADO) ---")
-
-db_user = os.getenv('DB_USER'); db_pass = os.getenv('DB_PASS')
-db_host = os.getenv('DB_HOST'); db_port = os.getenv('DB_PORT')
-db_name = os.getenv('DB_NAME'); pasta_macro = os.getenv('CAMINHO_MIDIA') 
-
-if not pasta_macro: exit("ERRO: Variável CAMINHO_MIDIA não definida.")
-
-try:
-    str_conexao = f'postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
-    db_connection = create_engine(str_conexao)
-    print("-> Banco conectado.")
-except Exception as e: exit(f"ERRO BANCO: {e}")
-
-mapas = carregar_mapas(db_connection)
-(gabarito_exibidor, mapa_exibidor) = mapas['exibidor']
-(gabarito_media, mapa_media) = mapas['media']
-(gabarito_classification, _) = mapas['classification']
-(gabarito_display_type, _) = mapas['display_type']
-(gabarito_cliente, _) = mapas['cliente'] 
-(gabarito_campaign, mapa_campaign) = mapas['campaign']
-(gabarito_target, mapa_target) = mapas['target']
-
-print("-> Verificando versões...")
-controle_versoes = {}
-try:
-    df_check = pd.read_sql("SELECT DISTINCT arquivo_origem, MAX(file_timestamp) as ts FROM fato_midia GROUP BY arquivo_origem", db_connection)
-    controle_versoes = dict(zip(df_check['arquivo_origem'], df_check['ts']))
-except Exception: pass
-
-contador_novos = 0; contador_atualizados = 0; contador_ignorados = 0
-arquivos_encontrados_na_pasta = []
-
-with db_connection.begin() as conn: 
-    for nome_cliente_pasta in os.listdir(pasta_macro):
+# --- MODO DE MEMÓRIA (settings.MODO_MEMORIA) ---
+# Colunas de texto repetitivo que podem virar category sem mudar o que vai para o banco
+# (code/location não entram: são únicos por linha e fazem parte da chave_linha)
+COLS_CATEGORIA = ['market', 'state', 'country', 'exibidor', 'media', 'classification', 'type',
+                  'campaign', 'target', 'size', 'frequency']
+COLS_FLOAT = ['period_quantity', 'insertion_faces_period', 'weekly_flow', 'weekly_impact', 'periodic_impact',
+              'faces_x_frequency', 'cpm_target', 'net_total', 'total_bonus', 'total_final']
+
+def compactar_plano(df_limpo):
+    # Texto repetitivo -> category; float64 -> float32 só quando o valor volta idêntico
+    # (o COPY grava o mesmo número e o merge não vê diferença).
+    for col in COLS_CATEGORIA:
+        if col in df_limpo.columns and df_limpo[col].dtype == object:
+            if df_limpo[col].nunique() <= len(df_limpo) * settings.LIMIAR_CATEGORIA:
+                try: df_limpo[col] = df_limpo[col].astype('category')
+                except (TypeError, ValueError): pass
+    for col in COLS_FLOAT:
+        if col in df_limpo.columns and df_limpo[col].dtype == 'float64':
+            reduzida = df_limpo[col].astype('float32')
+            if (reduzida.astype('float64') == df_limpo[col])[df_limpo[col].notna()].all(): df_limpo[col] = reduzida
+    return df_limpo
+
+
+# --- LIMPEZA (CPU PURA, SEM BANCO) ---
+def limpar_plano(df_limpo):
+    # --- GARANTIA DE COLUNAS (AUTO-NULL) ---
+    # Usa a lista do settings
+    colunas_obrigatorias_db = list(settings.SINONIMOS_COLUNAS_PADRAO.keys())
+    for col in colunas_obrigatorias_db:
+        if col not in df_limpo.columns: df_limpo[col] = None
+
+    if 'code' not in df_limpo.columns or df_limpo['code'].isnull().all():
+        return None, "[ALERTA] Coluna 'code' vazia."
+    df_limpo = df_limpo.dropna(subset=['code'])
+    try:
+        coluna_code_upper = df_limpo['code'].astype(str).str.upper().str.strip()
+        indices_total = df_limpo.index[coluna_code_upper.str.contains('TOTAL', na=False)].tolist()
+        if indices_total: df_limpo = df_limpo.loc[:indices_total[0]-1]
+    except: pass
+    
+    df_limpo = df_limpo[df_limpo['code'].astype(str).str.strip().str.len() < 25]
+
+    cols_title = ['market', 'location']
+    for col in cols_title:
+        if col in df_limpo.columns:
+            df_limpo[col] = df_limpo[col].astype(str).str.title().str.strip().replace('Nan', None)
+
+    cols_upper = ['country', 'state', 'code']
+    for col in cols_upper:
+        if col in df_limpo.columns:
+            df_limpo[col] = df_limpo[col].astype(str).str.upper().str.strip().replace('NAN', None)
+
+    cols_numericas = ['period_quantity', 'net_total', 'total_bonus', 'total_final', 'weekly_flow', 'weekly_impact', 'periodic_impact']
+    for col in cols_numericas:
+        if col in df_limpo.columns: df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
+    
+    if df_limpo.empty: return None, "[ALERTA] Arquivo vazio após limpeza."
+    if settings.MODO_MEMORIA == 'enxuto': df_limpo = compactar_plano(df_limpo)
+    return df_limpo, "OK"
+
+def ler_plano(tarefa):
+    # Saída padronizada do leitor. Reaproveitada do cache quando o conteúdo (hash) e a
+    # assinatura do leitor (VERSAO_LEITOR + sinônimos) batem; senão lê as abas brutas,
+    # que também vêm do cache se o arquivo já foi aberto antes.
+    if tarefa['cliente'] == 'BRADESCO':
+        # O Bradesco usa o nome do arquivo como código quando a Capa não tem DEMANDA
+        layout = f"bradesco{hashlib.sha1(tarefa['arquivo'].encode('utf-8')).hexdigest()[:8]}"
+    else: layout = 'padrao'
+    chave = f"{tarefa['hash']}_{layout}_{etl_cache.assinatura_leitor()}" if tarefa.get('hash') else None
+    df_lido = etl_cache.ler(chave) if chave else None
+    if df_lido is not None: return df_lido, "OK"
+
+    planilha = etl_planilha.PlanilhaBruta(tarefa['caminho'], tarefa.get('hash'))
+    try:
+        if tarefa['cliente'] == 'BRADESCO':
+            df_lido = etl_bradesco.ler_plano_bradesco(tarefa['caminho'], planilha)
+            erro_leitura = "Erro na leitura Bradesco"
+        else:
+            df_lido, erro_leitura = ler_plano_padrao(tarefa['caminho'], planilha)
+    finally: planilha.fechar()
+    if df_lido is None: return None, erro_leitura
+    if chave: etl_cache.gravar(chave, df_lido)
+    return df_lido, "OK"
+
+def _preparar_plano(tarefa, medidas):
+    try:
+        with medidas.etapa('leitura'): df_limpo, erro_leitura = ler_plano(tarefa)
+        if df_limpo is None: return None, f"[PULADO] {erro_leitura}"
+        with medidas.etapa('limpeza'): return limpar_plano(df_limpo)
+    except Exception as e: return None, f"-> ERRO NO ARQUIVO: {e}"
+
+def preparar_plano(tarefa):
+    # Leitura + padronização de colunas + limpeza. Não toca no banco,
+    # por isso pode rodar dentro do pool de processos (--workers).
+    # Devolve (df, mensagem, medidas); as medidas são exportadas pelo processo principal.
+    medidas = etl_metricas.Medidas()
+    with medidas.perfilando(): df_limpo, mensagem = _preparar_plano(tarefa, medidas)
+    return df_limpo, mensagem, medidas
+
+# --- CARGA (ÚNICO ESCRITOR NO BANCO) ---
+def gravar_plano(conn, tarefa, df_limpo, mensagem, mapas, medidas=None):
+    # Devolve 'ok', 'pulado' ou 'erro'. O arquivo roda num SAVEPOINT: se falhar, só
+    # ele é desfeito e a transação (única ou por arquivo) continua utilizável.
+    medidas = medidas or etl_metricas.Medidas()
+    with etl_metricas.arquivo_atual(medidas), medidas.perfilando(), medidas.etapa('gravacao'):
+        status = _gravar_plano(conn, tarefa, df_limpo, mensagem, mapas, medidas)
+    etl_metricas.finalizar_arquivo(tarefa, medidas, status)
+    return status
+
+def _gravar_plano(conn, tarefa, df_limpo, mensagem, mapas, medidas):
+    (_, mapa_exibidor, indice_exibidor) = mapas['exibidor']
+    (_, mapa_media, indice_media) = mapas['media']
+    (_, gabarito_classification) = mapas['classification']
+    (_, gabarito_display_type) = mapas['display_type']
+    (_, mapa_campaign, indice_campaign) = mapas['campaign']
+    (_, mapa_target, indice_target) = mapas['target']
+
+    print(f"  [{tarefa['modo']}] {tarefa['arquivo']}")
+    if df_limpo is None:
+        if tarefa['modo'] == 'ATUALIZAR':
+            marcar_alterados(conn, [tarefa['arquivo_origem']])
+            conn.execute(text("DELETE FROM fato_midia WHERE arquivo_origem = :arq"), {"arq": tarefa['arquivo_origem']})
+        print(f"     {mensagem}"); esquecer_versao(conn, tarefa['arquivo_origem']); return 'pulado'
+
+    try:
+        with conn.begin_nested():
+            print("     -> Normalizando...")
+            medidas.linhas = len(df_limpo)
+            
+            with medidas.etapa('normalizar_classification'): id_class_series = normalizar_coluna_simples(df_limpo['classification'], 'dim_classification', 'id_classification', gabarito_classification, conn)
+            with medidas.etapa('normalizar_display_type'): df_limpo['id_display_type'] = normalizar_coluna_simples(df_limpo['type'], 'dim_display_type', 'id_display_type', gabarito_display_type, conn)
+            with medidas.etapa('normalizar_exibidor'): df_limpo['id_exibidor'] = normalizar_coluna_fuzzy(df_limpo['exibidor'], 'exibidor', indice_exibidor, mapa_exibidor, conn)
+            with medidas.etapa('normalizar_campaign'): df_limpo['id_campaign'] = normalizar_coluna_fuzzy(df_limpo['campaign'], 'campaign', indice_campaign, mapa_campaign, conn)
+            with medidas.etapa('normalizar_target'): df_limpo['id_target'] = normalizar_coluna_fuzzy(df_limpo['target'], 'target', indice_target, mapa_target, conn)
+            with medidas.etapa('normalizar_media'): df_limpo['id_media'] = normalizar_coluna_fuzzy(df_limpo['media'], 'media', indice_media, mapa_media, conn, serie_classification=id_class_series)
+            
+            df_limpo['id_cliente'] = tarefa['id_cliente'] 
+            df_limpo['arquivo_origem'] = tarefa['arquivo_origem']
+            df_limpo['file_timestamp'] = tarefa['timestamp']
+            df_limpo['is_active'] = True
+            df_limpo['chave_linha'] = etl_carga.calcular_chave_linha(df_limpo)
+            
+            df_carga = df_limpo[[c for c in COLS_FINAIS if c in df_limpo.columns]]
+            
+            # Faixas de datas/partições antes e depois vão para as filas da diária e do Parquet
+            if tarefa['modo'] == 'ATUALIZAR': marcar_alterados(conn, [tarefa['arquivo_origem']])
+            with medidas.etapa('carga'): tocadas = etl_carga.atualizar_fato(conn, df_carga, tarefa['arquivo_origem'], tarefa['modo'])
+            marcar_alterados(conn, [tarefa['arquivo_origem']])
+            registrar_versao(conn, tarefa['arquivo_origem'], tarefa['hash'], tarefa['timestamp'])
+        medidas.tocadas = tocadas
+        print(f"     -> SUCESSO! {len(df_limpo)} linhas "
+              f"(+{tocadas['inseridas']} ~{tocadas['atualizadas']} -{tocadas['removidas']}).")
+        return 'ok'
+
+    except Exception as e:
+        print(f"     -> ERRO NO ARQUIVO: {e}"); esquecer_versao(conn, tarefa['arquivo_origem'])
+        # Ids criados dentro do SAVEPOINT desfeito podem ter ficado nos mapas em memória
+        mapas.update(carregar_mapas(conn))
+        return 'erro'
+
+# --- CONTROLE DE VERSÕES (MTIME + HASH DO CONTEÚDO) ---
+def garantir_tabela_controle(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS controle_arquivos (
+            arquivo_origem TEXT PRIMARY KEY,
+            hash_conteudo TEXT,
+            file_timestamp DOUBLE PRECISION,
+            atualizado_em TIMESTAMP DEFAULT now())"""))
+
+def carregar_controle_versoes(engine):
+    # arquivo_origem -> {'ts', 'hash'}. A fato dá o mtime dos arquivos antigos; a
+    # controle_arquivos (quando existe registro) tem o mtime/hash da última carga.
+    controle_versoes = {}
+    try:
+        df_check = pd.read_sql("SELECT DISTINCT arquivo_origem, MAX(file_timestamp) as ts FROM fato_midia GROUP BY arquivo_origem", engine)
+        controle_versoes = {arq: {'ts': ts, 'hash': None} for arq, ts in zip(df_check['arquivo_origem'], df_check['ts'])}
+    except Exception: pass
+    try:
+        df_controle = pd.read_sql("SELECT arquivo_origem, hash_conteudo, file_timestamp FROM controle_arquivos", engine)
+        for arq, hash_conteudo, ts in zip(df_controle['arquivo_origem'], df_controle['hash_conteudo'], df_controle['file_timestamp']):
+            controle_versoes[arq] = {'ts': ts, 'hash': hash_conteudo}
+    except Exception: pass
+    return controle_versoes
+
+def registrar_versao(conn, arquivo_origem, hash_conteudo, timestamp):
+    conn.execute(text("""INSERT INTO controle_arquivos (arquivo_origem, hash_conteudo, file_timestamp, atualizado_em)
+                         VALUES (:arq, :hash, :ts, now())
+                         ON CONFLICT (arquivo_origem) DO UPDATE SET hash_conteudo = EXCLUDED.hash_conteudo,
+                             file_timestamp = EXCLUDED.file_timestamp, atualizado_em = now()"""),
+                 {"arq": arquivo_origem, "hash": hash_conteudo, "ts": timestamp})
+
+def esquecer_versao(conn, arquivo_origem):
+    # Arquivo que falhou volta a ser tratado como NOVO na próxima rodada (como antes).
+    try: conn.execute(text("DELETE FROM controle_arquivos WHERE arquivo_origem = :arq"), {"arq": arquivo_origem})
+    except Exception: pass
+
+# --- CHECKPOINT DAS EXECUÇÕES (MODO --transacao arquivo) ---
+def garantir_tabelas_checkpoint(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS etl_execucao (
+            id_execucao SERIAL PRIMARY KEY,
+            iniciado_em TIMESTAMP DEFAULT now(),
+            finalizado_em TIMESTAMP)"""))
+        conn.execute(text("""CREATE TABLE IF NOT EXISTS etl_checkpoint (
+            id_execucao INTEGER REFERENCES etl_execucao (id_execucao),
+            arquivo_origem TEXT,
+            hash_conteudo TEXT,
+            status TEXT,
+            concluido_em TIMESTAMP DEFAULT now(),
+            PRIMARY KEY (id_execucao, arquivo_origem))"""))
+        conn.execute(text("ALTER TABLE etl_execucao ADD COLUMN IF NOT EXISTS instancia TEXT"))
+
+def abrir_execucao(conn, instancia=None):
+    # Retoma a última execução (desta instância, no modo --compartilhado) que não chegou
+    # ao fim; senão abre uma nova. Devolve (id_execucao, {arquivo_origem: hash gravado com sucesso nela}).
+    # Só status 'ok': arquivo que deu erro/pulou é tentado de novo, como numa execução nova.
+    id_execucao = conn.execute(text("SELECT MAX(id_execucao) FROM etl_execucao WHERE finalizado_em IS NULL AND instancia IS NOT DISTINCT FROM :inst"),
+                               {"inst": instancia}).scalar()
+    if id_execucao is None:
+        id_execucao = conn.execute(text("INSERT INTO etl_execucao (instancia) VALUES (:inst) RETURNING id_execucao"), {"inst": instancia}).scalar()
+        return id_execucao, {}
+    feitos = conn.execute(text("SELECT arquivo_origem, hash_conteudo FROM etl_checkpoint WHERE id_execucao = :id AND status = 'ok'"), {"id": id_execucao})
+    return id_execucao, dict(feitos.fetchall())
+
+def marcar_checkpoint(conn, id_execucao, tarefa, status):
+    conn.execute(text("""INSERT INTO etl_checkpoint (id_execucao, arquivo_origem, hash_conteudo, status)
+                         VALUES (:id, :arq, :hash, :status)
+                         ON CONFLICT (id_execucao, arquivo_origem) DO UPDATE SET hash_conteudo = EXCLUDED.hash_conteudo,
+                             status = EXCLUDED.status, concluido_em = now()"""),
+                 {"id": id_execucao, "arq": tarefa['arquivo_origem'], "hash": tarefa['hash'], "status": status})
+
+def fechar_execucao(conn, id_execucao):
+    conn.execute(text("UPDATE etl_execucao SET finalizado_em = now() WHERE id_execucao = :id"), {"id": id_execucao})
+
+# --- VARREDURA DA PASTA ---
+def avaliar_arquivo(conn, caminho_completo, arquivo, nome_cliente_upper, id_cliente, controle_versoes):
+    # Devolve a tarefa do arquivo, ou None se ele não mudou desde a última carga.
+    arquivo_origem = f"{nome_cliente_upper}/{arquivo}"
+    timestamp_atual = os.path.getmtime(caminho_completo)
+    
+    modo_operacao = 'NOVO'; hash_atual = None
+    versao = controle_versoes.get(arquivo_origem)
+    if versao is not None:
+        if versao['ts'] is not None and abs(timestamp_atual - versao['ts']) <= 0.1: return None
+        # mtime mudou: só reprocessa se o conteúdo mudou de fato (OneDrive reescreve mtime)
+        hash_atual = etl_cache.hash_arquivo(caminho_completo)
+        if versao['hash'] == hash_atual:
+            registrar_versao(conn, arquivo_origem, hash_atual, timestamp_atual)
+            controle_versoes[arquivo_origem] = {'ts': timestamp_atual, 'hash': hash_atual}
+            return None
+        modo_operacao = 'ATUALIZAR'
+    if hash_atual is None: hash_atual = etl_cache.hash_arquivo(caminho_completo)
+
+    return {'arquivo': arquivo, 'arquivo_origem': arquivo_origem, 'caminho': caminho_completo,
+            'cliente': nome_cliente_upper, 'id_cliente': id_cliente,
+            'timestamp': timestamp_atual, 'hash': hash_atual, 'modo': modo_operacao}
+
+def listar_clientes(pasta_macro):
+    return [nome for nome in os.listdir(pasta_macro) if os.path.isdir(os.path.join(pasta_macro, nome))]
+
+def listar_tarefas(conn, pasta_macro, mapas, controle_versoes, clientes=None):
+    # clientes: só essas pastas (modo --compartilhado); None = todas
+    (_, gabarito_cliente) = mapas['cliente']
+    tarefas = []; arquivos_encontrados_na_pasta = []; contador_ignorados = 0
+
+    for nome_cliente_pasta in (os.listdir(pasta_macro) if clientes is None else clientes):
         pasta_cliente = os.path.join(pasta_macro, nome_cliente_pasta)
         if not os.path.isdir(pasta_cliente): continue
         
@@ -157,112 +509,316 @@ with db_connection.begin() as conn:
         for arquivo in os.listdir(pasta_cliente):
             if not (arquivo.endswith('.xlsx') and not arquivo.startswith('~$')): continue
             
-            arquivo_origem = f"{nome_cliente_upper}/{arquivo}"
-            arquivos_encontrados_na_pasta.append(arquivo_origem)
-            caminho_completo = os.path.join(pasta_cliente, arquivo)
-            timestamp_atual = os.path.getmtime(caminho_completo)
-            
-            modo_operacao = 'NOVO'
-            if arquivo_origem in controle_versoes:
-                if controle_versoes[arquivo_origem] is not None and abs(timestamp_atual - controle_versoes[arquivo_origem]) <= 0.1:
-                    contador_ignorados += 1; continue
-                modo_operacao = 'ATUALIZAR'
+            arquivos_encontrados_na_pasta.append(f"{nome_cliente_upper}/{arquivo}")
+            tarefa = avaliar_arquivo(conn, os.path.join(pasta_cliente, arquivo), arquivo, nome_cliente_upper, id_cliente, controle_versoes)
+            if tarefa is None: contador_ignorados += 1
+            else: tarefas.append(tarefa)
 
-            print(f"  [{modo_operacao}] {arquivo}")
-            
-            if modo_operacao == 'ATUALIZAR':
-                conn.execute(text("DELETE FROM fato_midia WHERE arquivo_origem = :arq"), {"arq": arquivo_origem})
-                contador_atualizados += 1
-            else: contador_novos += 1
-
-            df_limpo = None
-            erro_leitura = ""
-
-            if nome_cliente_upper == 'BRADESCO':
-                df_limpo = etl_bradesco.ler_plano_bradesco(caminho_completo)
-                if df_limpo is None: erro_leitura = "Erro na leitura Bradesco"
-            else:
-                df_limpo, erro_leitura = ler_plano_padrao(caminho_completo)
-
-            if df_limpo is None:
-                print(f"     [PULADO] {erro_leitura}"); continue
-
-            try:
-                # --- GARANTIA DE COLUNAS (AUTO-NULL) ---
-                # Usa a lista do settings
-                colunas_obrigatorias_db = list(settings.SINONIMOS_COLUNAS_PADRAO.keys())
-                for col in colunas_obrigatorias_db:
-                    if col not in df_limpo.columns: df_limpo[col] = None
-
-                if 'code' not in df_limpo.columns or df_limpo['code'].isnull().all():
-                     print("     [ALERTA] Coluna 'code' vazia."); continue
-                df_limpo = df_limpo.dropna(subset=['code'])
-                try:
-                    coluna_code_upper = df_limpo['code'].astype(str).str.upper().str.strip()
-                    indices_total = df_limpo.index[coluna_code_upper.str.contains('TOTAL', na=False)].tolist()
-                    if indices_total: df_limpo = df_limpo.loc[:indices_total[0]-1]
-                except: pass
-                
-                df_limpo = df_limpo[df_limpo['code'].apply(lambda x: len(str(x).strip()) < 25)]
-
-                cols_title = ['market', 'location']
-                for col in cols_title:
-                    if col in df_limpo.columns:
-                        df_limpo[col] = df_limpo[col].astype(str).str.title().str.strip().replace('Nan', None)
-
-                cols_upper = ['country', 'state', 'code']
-                for col in cols_upper:
-                    if col in df_limpo.columns:
-                        df_limpo[col] = df_limpo[col].astype(str).str.upper().str.strip().replace('NAN', None)
-
-                cols_numericas = ['period_quantity', 'net_total', 'total_bonus', 'total_final', 'weekly_flow', 'weekly_impact', 'periodic_impact']
-                for col in cols_numericas:
-                    if col in df_limpo.columns: df_limpo[col] = pd.to_numeric(df_limpo[col], errors='coerce')
-                
-                if df_limpo.empty: print("     [ALERTA] Arquivo vazio após limpeza."); continue
-                
-                print("     -> Normalizando...")
-                
-                id_class_series = df_limpo['classification'].apply(lambda x: normalizar_dado_simples(x, 'dim_classification', 'id_classification', gabarito_classification, conn))
-                df_limpo['id_display_type'] = df_limpo['type'].apply(lambda x: normalizar_dado_simples(x, 'dim_display_type', 'id_display_type', gabarito_display_type, conn))
-                df_limpo['id_exibidor'] = df_limpo['exibidor'].apply(lambda x: normalizar_dado_fuzzy(x, 'exibidor', gabarito_exibidor, mapa_exibidor, conn))
-                df_limpo['id_campaign'] = df_limpo['campaign'].apply(lambda x: normalizar_dado_fuzzy(x, 'campaign', gabarito_campaign, mapa_campaign, conn))
-                df_limpo['id_target'] = df_limpo['target'].apply(lambda x: normalizar_dado_fuzzy(x, 'target', gabarito_target, mapa_target, conn))
-                df_limpo['id_media'] = df_limpo.apply(lambda row: normalizar_dado_fuzzy(row['media'], 'media', gabarito_media, mapa_media, conn, id_classification_fk=id_class_series.get(row.name)), axis=1)
-                
-                df_limpo['id_cliente'] = id_cliente 
-                df_limpo['arquivo_origem'] = arquivo_origem
-                df_limpo['file_timestamp'] = timestamp_atual
-                df_limpo['is_active'] = True
-                
-                cols_finais = [
-                    'code', 'size', 'frequency', 'period_quantity', 'insertion_faces_period', 
-                    'start_date', 'end_date', 'weekly_flow', 'weekly_impact', 'periodic_impact', 
-                    'faces_x_frequency', 'cpm_target', 'net_total', 'total_bonus', 'total_final',
-                    'id_display_type', 'id_exibidor', 'id_campaign', 'id_target', 'id_media', 'id_cliente',
-                    'arquivo_origem', 'file_timestamp', 'is_active',
-                    'country', 'market', 'state', 'location'
-                ]
-                
-                df_carga = df_limpo[[c for c in cols_finais if c in df_limpo.columns]]
-                
-                df_carga.to_sql('fato_midia', con=conn, if_exists='append', index=False, method='multi')
-                print(f"     -> SUCESSO! {len(df_limpo)} linhas.")
-
-            except Exception as e: print(f"     -> ERRO NO ARQUIVO: {e}")
+    return tarefas, arquivos_encontrados_na_pasta, contador_ignorados
+
+def preparar_em_paralelo(tarefas, workers):
+    # Entrega (tarefa, df, mensagem, medidas) na mesma ordem da varredura, mantendo no
+    # máximo 2 * workers arquivos em voo para não acumular DataFrames na memória.
+    # Worker que morre (ex.: falta de memória num plano enorme) quebra o pool inteiro:
+    # o pool é recriado e os arquivos em voo reenviados; o arquivo da vez ganha uma
+    # segunda chance e, se quebrar de novo, sai como erro (sem derrubar a execução).
+    pool = ProcessPoolExecutor(max_workers=workers); em_voo = deque(); quebras = {}
+
+    def enviar(tarefa):
+        # Pool que quebrou e ainda não foi recriado recusa o submit: vira um futuro com o erro
+        try: return pool.submit(preparar_plano, tarefa)
+        except BrokenProcessPool as e:
+            futuro = Future(); futuro.set_exception(e); return futuro
+
+    def entregar():
+        nonlocal pool
+        while True:
+            tarefa, futuro = em_voo.popleft()
+            try: return (tarefa, *futuro.result())
+            except BrokenProcessPool as e:
+                pool.shutdown(wait=False, cancel_futures=True); pool = ProcessPoolExecutor(max_workers=workers)
+                quebras[tarefa['arquivo_origem']] = quebras.get(tarefa['arquivo_origem'], 0) + 1
+                reenviar = [t for t, _ in em_voo]; em_voo.clear()
+                if quebras[tarefa['arquivo_origem']] > 1:
+                    for t in reenviar: em_voo.append((t, enviar(t)))
+                    return tarefa, None, f"-> ERRO NO ARQUIVO: worker encerrado ({e})", etl_metricas.Medidas()
+                print(f"     [AVISO] Worker encerrado durante {tarefa['arquivo']}; recriando o pool.")
+                for t in [tarefa] + reenviar: em_voo.append((t, enviar(t)))
+            except Exception as e: return tarefa, None, f"-> ERRO NO ARQUIVO: {e}", etl_metricas.Medidas()
+
+    try:
+        for tarefa in tarefas:
+            em_voo.append((tarefa, enviar(tarefa)))
+            if len(em_voo) >= 2 * workers: yield entregar()
+        while em_voo: yield entregar()
+    finally: pool.shutdown(wait=False, cancel_futures=True)
+
+def preparar(tarefas, workers):
+    # tarefas pode ser um gerador (modo --compartilhado: clientes reivindicados durante a execução)
+    total = f"{len(tarefas)} " if isinstance(tarefas, list) else ""
+    if workers > 1 and (not total or len(tarefas) > 1):
+        print(f"\n--- Processando {total}arquivos com {workers} workers ---")
+        return preparar_em_paralelo(tarefas, workers)
+    print(f"\n--- Processando {total}arquivos ---")
+    return ((tarefa, *preparar_plano(tarefa)) for tarefa in tarefas)
 
+def sincronizar_deletados(conn, arquivos_encontrados_na_pasta, clientes=None):
+    # Soft delete num UPDATE só: inativa tudo que está ativo e não veio na varredura.
+    # clientes: restringe aos clientes desta instância (modo --compartilhado).
+    # Devolve {arquivo_origem: linhas inativadas}.
     print("\n--- Sincronizando arquivos deletados ---")
     try:
-        set_arquivos_pasta = set(arquivos_encontrados_na_pasta) 
-        query_ativos = "SELECT DISTINCT arquivo_origem FROM fato_midia WHERE is_active = true"
-        df_banco_ativos = pd.read_sql(query_ativos, conn)
-        set_banco_ativos = set(df_banco_ativos['arquivo_origem'])
-        arquivos_para_inativar = set_banco_ativos - set_arquivos_pasta
-        if arquivos_para_inativar:
-            print(f"-> Inativando {len(arquivos_para_inativar)} arquivos.")
-            for arq_morto in arquivos_para_inativar:
-                conn.execute(text("UPDATE fato_midia SET is_active = false WHERE arquivo_origem = :arq"), {"arq": arq_morto})
+        filtro_clientes = "" if clientes is None else "AND split_part(arquivo_origem, '/', 1) = ANY(:clientes)"
+        sql_poda = text(f"""WITH mortos AS (
+                UPDATE fato_midia SET is_active = false
+                WHERE is_active = true AND NOT (arquivo_origem = ANY(:arqs)) {filtro_clientes}
+                RETURNING arquivo_origem)
+            SELECT arquivo_origem, COUNT(*) FROM mortos GROUP BY arquivo_origem""")
+        params = {"arqs": list(set(arquivos_encontrados_na_pasta))}
+        if clientes is not None: params["clientes"] = sorted(clientes)
+        with conn.begin_nested():
+            inativados = dict(conn.execute(sql_poda, params).fetchall())
+            marcar_alterados(conn, list(inativados))
+            # Esquece a versão: se o arquivo for restaurado com o mesmo conteúdo (lixeira do
+            # OneDrive), o hash bateria e as linhas ficariam inativas para sempre
+            conn.execute(text("DELETE FROM controle_arquivos WHERE arquivo_origem = ANY(:arqs)"), {"arqs": list(inativados)})
+        if inativados:
+            print(f"-> Inativados {len(inativados)} arquivos ({sum(inativados.values())} linhas).")
         else: print("-> Banco sincronizado.")
-    except Exception as e: print(f"   -> Erro na poda: {e}")
+        return inativados
+    except Exception as e: print(f"   -> Erro na poda: {e}"); return {}
+
+
+def marcar_alterados(conn, arquivos_origem):
+    # Filas da diária e da exportação Parquet: chamar antes e depois de mexer nas linhas dos arquivos
+    etl_diaria.marcar_pendente(conn, arquivos_origem)
+    etl_exportacao.marcar_pendente(conn, arquivos_origem)
+
+def exportar_parquet(conn, campos=None):
+    # Regrava em PASTA_EXPORTACAO só as partições (cliente, mês) que mudaram
+    try:
+        with conn.begin_nested(): particoes, linhas = etl_exportacao.exportar(conn)
+        if particoes: print(f"-> Parquet: {particoes} partições regravadas ({linhas} linhas).")
+        if campos is not None: campos.update(particoes=particoes, linhas=linhas)
+    except Exception as e: print(f"   -> Erro na exportação Parquet (fica pendente para a próxima execução): {e}")
+
+def atualizar_diaria(conn, campos=None):
+    # Recalcula na fato_midia_diaria só os dias dos arquivos que mudaram (fila de pendentes)
+    try:
+        with conn.begin_nested(): faixas, linhas = etl_diaria.atualizar(conn)
+        if faixas: print(f"-> Diária: {faixas} faixas de datas recalculadas ({linhas} linhas).")
+        if campos is not None: campos.update(faixas=faixas, linhas=linhas)
+    except Exception as e: print(f"   -> Erro na diária (fica pendente para a próxima execução): {e}")
+
+
+# --- EXECUÇÃO ---
+def executar(engine, pasta_macro, mapas, controle_versoes, workers=1, transacao='unica', coordenador=None):
+    # transacao='unica'   -> tudo numa transação só (comportamento histórico)
+    # transacao='arquivo' -> varredura, cada arquivo e a poda commitam separado; o progresso
+    #                        vai para etl_checkpoint e uma execução interrompida é retomada
+    # coordenador         -> modo --compartilhado: cada pasta de cliente só é processada depois
+    #                        de reivindicada; a poda fica restrita aos clientes desta instância
+    por_arquivo = transacao == 'arquivo'
+    def bloco(): return conn.begin() if por_arquivo else nullcontext()
+    instancia = coordenador.instancia if coordenador else None
+    contador_novos = contador_atualizados = contador_ignorados = 0
+    arquivos_encontrados_na_pasta = []
+
+    with engine.connect() as conn, (nullcontext() if por_arquivo else conn.begin()):
+        if por_arquivo:
+            with bloco(): id_execucao, feitos = abrir_execucao(conn, instancia)
+
+        # Sem coordenador é um lote só com todas as pastas; com ele, um lote por cliente,
+        # reivindicado só quando o pool pede mais trabalho (um pool para a execução inteira)
+        clientes_na_pasta = listar_clientes(pasta_macro)
+        lotes = [None] if coordenador is None else [[c] for c in clientes_na_pasta]
+        def varrer():
+            nonlocal contador_novos, contador_atualizados, contador_ignorados
+            for lote in lotes:
+                if lote is not None and not coordenador.tentar(str(lote[0]).strip().upper()):
+                    print(f"\n--- Cliente: {str(lote[0]).strip().upper()} (com outra instância) ---"); continue
+
+                with bloco(), etl_metricas.medir('varredura') as campos:
+                    tarefas, encontrados, ignorados = listar_tarefas(conn, pasta_macro, mapas, controle_versoes, clientes=lote)
+                    campos.update(arquivos=len(encontrados), tarefas=len(tarefas))
+                    if por_arquivo:
+                        pendentes = [t for t in tarefas if feitos.get(t['arquivo_origem']) != t['hash']]
+                        if len(pendentes) < len(tarefas):
+                            print(f"\n-> Retomando execução {id_execucao}: {len(tarefas) - len(pendentes)} arquivos já processados.")
+                        ignorados += len(tarefas) - len(pendentes); tarefas = pendentes
+                arquivos_encontrados_na_pasta.extend(encontrados); contador_ignorados += ignorados
+                novos = sum(1 for t in tarefas if t['modo'] == 'NOVO')
+                contador_novos += novos; contador_atualizados += len(tarefas) - novos
+                yield from tarefas
+
+        # Sem coordenador a varredura inteira vem antes (como sempre); com ele o gerador
+        # só avança entre um arquivo e outro, fora das transações de gravação
+        fonte = varrer() if coordenador is not None else list(varrer())
+        for tarefa, df_limpo, mensagem, medidas in preparar(fonte, workers):
+            with bloco():
+                status = gravar_plano(conn, tarefa, df_limpo, mensagem, mapas, medidas)
+                if por_arquivo: marcar_checkpoint(conn, id_execucao, tarefa, status)
+
+        with bloco(), etl_metricas.medir('sincronizar_deletados') as campos:
+            clientes_poda = None
+            if coordenador is not None:
+                orfaos = coordenador.reivindicar_orfaos(conn, [str(c).strip().upper() for c in clientes_na_pasta])
+                if orfaos: print(f"\n-> Clientes sem pasta assumidos por esta instância: {', '.join(orfaos)}")
+                clientes_poda = coordenador.donos
+            inativados = sincronizar_deletados(conn, arquivos_encontrados_na_pasta, clientes_poda)
+            etl_metricas.contar_inativadas(inativados); campos.update(arquivos=len(inativados), linhas=sum(inativados.values()))
+        with bloco(), etl_metricas.medir('diaria') as campos:
+            atualizar_diaria(conn, campos)
+        with bloco(), etl_metricas.medir('exportacao') as campos:
+            exportar_parquet(conn, campos)
+            if por_arquivo: fechar_execucao(conn, id_execucao)
+
+    return contador_novos, contador_atualizados, contador_ignorados
+
+
+# --- MODO WATCH (PROCESSO CONTÍNUO, MAPAS QUENTES) ---
+def observar_pasta(engine, pasta_macro, mapas, controle_versoes, workers=1, coordenador=None):
+    # Mapas de normalização, índices fuzzy e controle de versões ficam em memória entre
+    # os eventos; cada lote processa só os arquivos que mudaram, um commit por arquivo.
+    # Arquivo que não deu para ler (travado/meio sincronizado) mantém as linhas que já
+    # estão no banco e volta para a fila com espera crescente, até OBSERVADOR_TENTATIVAS.
+    (_, gabarito_cliente) = mapas['cliente']
+    fila = etl_observador.FilaDebounce(pasta_macro, settings.OBSERVADOR_ESPERA_S); tentativas = {}
+    def tentar_de_novo(tarefa, mensagem):
+        n = tentativas.get(tarefa['caminho'], 0) + 1
+        if n > settings.OBSERVADOR_TENTATIVAS:
+            tentativas.pop(tarefa['caminho'], None)
+            print(f"     [ALERTA] Desistindo após {n - 1} tentativas; linhas anteriores mantidas até o próximo salvamento."); return
+        atraso = min(settings.OBSERVADOR_ESPERA_S * 2 ** n, 600)
+        tentativas[tarefa['caminho']] = n; fila.reagendar(tarefa['caminho'], atraso)
+        print(f"     [AVISO] {mensagem} -> nova tentativa ({n}/{settings.OBSERVADOR_TENTATIVAS}) em {atraso}s.")
+
+    print(f"\n--- MODO WATCH: observando {pasta_macro} (Ctrl+C para sair) ---")
+    for alterados, removidos in etl_observador.observar(pasta_macro, fila=fila):
+        with engine.connect() as conn:
+            tarefas = []
+            with conn.begin():
+                for caminho in alterados:
+                    if not os.path.exists(caminho): continue
+                    nome_cliente_pasta = os.path.basename(os.path.dirname(caminho))
+                    if coordenador is not None and not coordenador.tentar(str(nome_cliente_pasta).strip().upper()): continue
+                    id_cliente = normalizar_dado_simples(nome_cliente_pasta, 'dim_cliente', 'id_cliente', gabarito_cliente, conn)
+                    tarefa = avaliar_arquivo(conn, caminho, os.path.basename(caminho), str(nome_cliente_pasta).strip().upper(), id_cliente, controle_versoes)
+                    if tarefa is not None: tarefas.append(tarefa)
+
+            for tarefa, df_limpo, mensagem, medidas in preparar(tarefas, workers):
+                if df_limpo is None:
+                    # Sem o DELETE do gravar_plano: o que já estava no banco fica
+                    print(f"  [{tarefa['modo']}] {tarefa['arquivo']}"); etl_metricas.finalizar_arquivo(tarefa, medidas, 'pulado')
+                    tentar_de_novo(tarefa, mensagem); continue
+                with conn.begin():
+                    status = gravar_plano(conn, tarefa, df_limpo, mensagem, mapas, medidas)
+                # Falha no banco: o savepoint desfez só o arquivo, as linhas antigas continuam.
+                # O controle em memória fica com a versão anterior para a nova tentativa sair como ATUALIZAR.
+                if status == 'ok':
+                    controle_versoes[tarefa['arquivo_origem']] = {'ts': tarefa['timestamp'], 'hash': tarefa['hash']}
+                    tentativas.pop(tarefa['caminho'], None)
+                else: tentar_de_novo(tarefa, "Falha ao gravar")
+
+            for caminho in removidos: tentativas.pop(caminho, None)
+            arquivos_mortos = [f"{os.path.basename(os.path.dirname(c)).strip().upper()}/{os.path.basename(c)}" for c in removidos]
+            if coordenador is not None: arquivos_mortos = [a for a in arquivos_mortos if coordenador.tentar(a.split('/')[0])]
+            if arquivos_mortos:
+                with conn.begin():
+                    linhas = conn.execute(text("UPDATE fato_midia SET is_active = false WHERE is_active = true AND arquivo_origem = ANY(:arqs)"),
+                                          {"arqs": arquivos_mortos}).rowcount
+                    marcar_alterados(conn, arquivos_mortos)
+                    # Se o arquivo voltar (mesmo conteúdo), precisa ser reprocessado como ATUALIZAR:
+                    # sem hash conhecido não é pulado, e o merge reativa/substitui as linhas inativas
+                    for arq in arquivos_mortos: esquecer_versao(conn, arq); controle_versoes[arq] = {'ts': None, 'hash': None}
+                print(f"  [REMOVIDO] {len(arquivos_mortos)} arquivos ({linhas} linhas inativadas).")
+                etl_metricas.contar_inativadas({'watch': linhas})
+            with conn.begin(), etl_metricas.medir('diaria') as campos: atualizar_diaria(conn, campos)
+            with conn.begin(), etl_metricas.medir('exportacao') as campos: exportar_parquet(conn, campos)
+        etl_metricas.exportar()
+        # Processo de vida longa: aplica CACHE_TAMANHO_MAX_MB a cada lote, não só na partida
+        podados = etl_cache.podar()
+        if podados: print(f"-> Cache: {podados} entradas antigas removidas.")
+
+
+# --- SCRIPT PRINCIPAL ---
+def main():
+    parser = argparse.ArgumentParser(description="ETL de planos de mídia OOH.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processos para leitura/limpeza dos Excel em paralelo (1 = serial).")
+    parser.add_argument('--transacao', choices=['unica', 'arquivo'], default=settings.MODO_TRANSACAO,
+                        help="'arquivo' commita cada plano separado e retoma execuções interrompidas.")
+    parser.add_argument('--reconstruir-diaria', action='store_true',
+                        help="Recalcula a fato_midia_diaria inteira nesta execução.")
+    parser.add_argument('--reexportar', action='store_true',
+                        help="Regrava todas as partições Parquet de PASTA_EXPORTACAO nesta execução.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Depois da carga inicial, fica observando CAMINHO_MIDIA e processa só o que mudar.")
+    parser.add_argument('--compartilhado', action='store_true', default=settings.MODO_COMPARTILHADO,
+                        help="Várias instâncias na mesma pasta/banco: cada pasta de cliente fica com uma só (advisory lock).")
+    parser.add_argument('--instancia', default=None,
+                        help="Nome fixo desta instância no modo --compartilhado (padrão: hostname-pid; use um nome fixo para retomar execuções interrompidas).")
+    args = parser.parse_args()
+
+    load_dotenv()
+    print("\n--- INICIANDO ETL v11.0 (SETTINGS SEPARADO) ---")
+
+    db_user = os.getenv('DB_USER'); db_pass = os.getenv('DB_PASS')
+    db_host = os.getenv('DB_HOST'); db_port = os.getenv('DB_PORT')
+    db_name = os.getenv('DB_NAME'); pasta_macro = os.getenv('CAMINHO_MIDIA') 
+
+    if not pasta_macro: exit("ERRO: Variável CAMINHO_MIDIA não definida.")
+
+    try:
+        str_conexao = f'postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
+        db_connection = create_engine(str_conexao)
+        print("-> Banco conectado.")
+    except Exception as e: exit(f"ERRO BANCO: {e}")
+
+    inicio_execucao = time.time()
+    etl_metricas.configurar(db_connection)
+    etl_dimensoes.garantir_id_alias(db_connection)
+    mapas = carregar_mapas(db_connection)
+
+    print("-> Verificando versões...")
+    garantir_tabela_controle(db_connection)
+    etl_carga.garantir_chave_linha(db_connection)
+    controle_versoes = carregar_controle_versoes(db_connection)
+    if settings.MANTER_DIARIA:
+        tabela_nova = etl_diaria.garantir_tabelas_diaria(db_connection)
+        if tabela_nova or args.reconstruir_diaria:
+            print("-> Diária: recálculo completo agendado.")
+            with db_connection.begin() as conn: etl_diaria.marcar_tudo(conn)
+    if etl_exportacao.ativa():
+        if etl_exportacao.garantir_tabela_exportacao(db_connection) or args.reexportar:
+            print("-> Parquet: exportação completa agendada.")
+            with db_connection.begin() as conn: etl_exportacao.marcar_tudo(conn)
+
+    coordenador = None
+    if args.compartilhado:
+        # Commit por arquivo: numa transação única as outras instâncias esperariam pelos locks de linha até o fim
+        if args.transacao != 'arquivo': print("-> [AVISO] --compartilhado usa --transacao arquivo."); args.transacao = 'arquivo'
+        coordenador = etl_instancias.Coordenador(db_connection, args.instancia)
+        etl_metricas.INSTANCIA = coordenador.instancia
+        print(f"-> Modo compartilhado: instância '{coordenador.instancia}'.")
+
+    if args.transacao == 'arquivo': garantir_tabelas_checkpoint(db_connection)
+    contador_novos, contador_atualizados, contador_ignorados = executar(
+        db_connection, pasta_macro, mapas, controle_versoes, workers=args.workers, transacao=args.transacao, coordenador=coordenador)
+
+    removidos = etl_cache.podar()
+    if removidos: print(f"-> Cache: {removidos} entradas antigas removidas.")
+
+    etl_metricas.encerrar(inicio_execucao, contador_novos, contador_atualizados, contador_ignorados)
+    print(f"\n--- FIM: Novos: {contador_novos} | Atualizados: {contador_atualizados} | Ignorados: {contador_ignorados} ---")
+
+    if args.watch:
+        # A carga inicial gravou direto no banco; recarrega o controle uma vez e daí em diante é só memória
+        controle_versoes = carregar_controle_versoes(db_connection)
+        try: observar_pasta(db_connection, pasta_macro, mapas, controle_versoes, workers=args.workers, coordenador=coordenador)
+        except KeyboardInterrupt: print("\n--- WATCH ENCERRADO ---")
+    if coordenador is not None: coordenador.fechar()
+
 
-print(f"\n--- FIM: Novos: {contador_novos} | Atualizados: {contador_atualizados} | Ignorados: {contador_ignorados} ---")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+import settings # <--- Importa o arquivo de configurações
+
+# watchdog é opcional: usa inotify (Linux) / ReadDirectoryChangesW (Windows).
+# Sem ele, ou com MODO_OBSERVADOR = 'polling' (pastas de rede, onde inotify não
+# enxerga alterações feitas por outras máquinas), a pasta é listada a cada intervalo.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None; FileSystemEventHandler = object
+
+# ==============================================================================
+# OBSERVADOR DA PASTA DE MÍDIA (MODO --watch)
+# ==============================================================================
+# Só interessa CAMINHO_MIDIA/<cliente>/<plano>.xlsx. Cada alteração reinicia uma
+# espera (settings.OBSERVADOR_ESPERA_S); o arquivo só é entregue depois de ficar
+# quieto esse tempo, o que absorve salvamentos parciais do Excel/OneDrive.
+# Arquivos de lock (~$) são ignorados.
+
+def eh_plano(pasta_macro, caminho):
+    nome = os.path.basename(caminho)
+    if not nome.endswith('.xlsx') or nome.startswith('~$'): return False
+    return os.path.dirname(os.path.dirname(os.path.abspath(caminho))) == os.path.abspath(pasta_macro)
+
+
+class FilaDebounce:
+    def __init__(self, pasta_macro, espera):
+        self.pasta_macro = pasta_macro; self.espera = espera
+        self._lock = threading.Lock()
+        self._alterados = {}; self._removidos = set()
+
+    def alterado(self, caminho):
+        if not eh_plano(self.pasta_macro, caminho): return
+        with self._lock:
+            self._alterados[caminho] = time.monotonic(); self._removidos.discard(caminho)
+
+    def reagendar(self, caminho, atraso):
+        # Devolve o arquivo à fila para ser entregue daqui a `atraso` segundos (nova tentativa)
+        with self._lock:
+            if caminho not in self._removidos: self._alterados[caminho] = time.monotonic() + atraso - self.espera
+
+    def removido(self, caminho):
+        if not eh_plano(self.pasta_macro, caminho): return
+        with self._lock:
+            self._alterados.pop(caminho, None); self._removidos.add(caminho)
+
+    def coletar(self):
+        # (alterados quietos há pelo menos `espera` segundos, removidos)
+        agora = time.monotonic()
+        with self._lock:
+            prontos = sorted(c for c, instante in self._alterados.items() if agora - instante >= self.espera)
+            for caminho in prontos: del self._alterados[caminho]
+            removidos = sorted(self._removidos); self._removidos.clear()
+        return prontos, removidos
+
+
+class _Manipulador(FileSystemEventHandler):
+    def __init__(self, fila): self.fila = fila
+    def on_created(self, evento):
+        if not evento.is_directory: self.fila.alterado(evento.src_path)
+    def on_modified(self, evento):
+        if not evento.is_directory: self.fila.alterado(evento.src_path)
+    def on_deleted(self, evento):
+        if not evento.is_directory: self.fila.removido(evento.src_path)
+    def on_moved(self, evento):
+        if evento.is_directory: return
+        self.fila.removido(evento.src_path); self.fila.alterado(evento.dest_path)
+
+
+def _fotografar(pasta_macro):
+    # {caminho: (mtime, tamanho)} de todos os planos, sem abrir nenhum arquivo
+    foto = {}
+    for cliente in os.scandir(pasta_macro):
+        if not cliente.is_dir(): continue
+        for arquivo in os.scandir(cliente.path):
+            if arquivo.is_file() and eh_plano(pasta_macro, arquivo.path):
+                info = arquivo.stat(); foto[arquivo.path] = (info.st_mtime, info.st_size)
+    return foto
+
+def observar(pasta_macro, modo=None, intervalo=None, espera=None, fila=None):
+    """Gera lotes (alterados, removidos) de caminhos completos, para sempre.
+    Passe a `fila` para poder reagendar arquivos que falharam."""
+    modo = modo or settings.MODO_OBSERVADOR
+    intervalo = intervalo or settings.OBSERVADOR_INTERVALO_S
+    espera = settings.OBSERVADOR_ESPERA_S if espera is None else espera
+    fila = fila or FilaDebounce(pasta_macro, espera)
+
+    usar_eventos = modo != 'polling' and Observer is not None
+    if modo == 'inotify' and Observer is None: print("-> [AVISO] watchdog não instalado. Usando polling.")
+    if usar_eventos:
+        observador = Observer()
+        observador.schedule(_Manipulador(fila), pasta_macro, recursive=True)
+        observador.start()
+        print(f"-> Observando eventos do sistema de arquivos (espera de {espera}s).")
+    else:
+        observador = None; foto = _fotografar(pasta_macro); proxima_foto = time.monotonic() + intervalo
+        print(f"-> Observando por polling a cada {intervalo}s (espera de {espera}s).")
+
+    try:
+        while True:
+            if observador is None and time.monotonic() >= proxima_foto:
+                nova_foto = _fotografar(pasta_macro)
+                for caminho, assinatura in nova_foto.items():
+                    if foto.get(caminho) != assinatura: fila.alterado(caminho)
+                for caminho in foto.keys() - nova_foto.keys(): fila.removido(caminho)
+                foto = nova_foto; proxima_foto = time.monotonic() + intervalo
+            alterados, removidos = fila.coletar()
+            if alterados or removidos: yield alterados, removidos
+            time.sleep(0.5)
+    finally:
+        if observador is not None: observador.stop(); observador.join()
@@ -0,0 +1,169 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import etl_cache
+import settings # <--- Importa o arquivo de configurações
+
+# ==============================================================================
+# LEITURA BRUTA DAS PLANILHAS (UMA VEZ POR ABA, COM CACHE PELO HASH)
+# ==============================================================================
+# Os leitores (ler_plano_padrao / ler_plano_bradesco) procuram o cabeçalho na
+# grade lida com header=None e depois "promovem" a linha encontrada, em vez de
+# chamar pd.read_excel de novo. A grade bruta fica no cache pelo hash do arquivo,
+# então mudar a lógica dos leitores (VERSAO_LEITOR) não obriga a reabrir o Excel.
+#
+# Motores (settings.MOTOR_EXCEL):
+#   'streaming' -> openpyxl read_only linha a linha; para no primeiro TOTAL abaixo
+#                  do cabeçalho sem carregar o resto da aba
+#   'openpyxl'  -> pd.read_excel tradicional (aba inteira, corte do TOTAL depois)
+#   'calamine'  -> pd.read_excel(engine='calamine'), precisa do python-calamine
+# Os três devolvem a mesma grade: células convertidas como o pandas faz, vazios e
+# textos tipo 'N/A' viram NaN, tipos inferidos por coluna depois do corte.
+
+LINHAS_BUSCA_CABECALHO = 30
+
+# Mesmos textos que o read_excel trata como nulo por padrão
+_VALORES_NA = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+               '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+
+class LimiteTotal:
+    """Regra de parada: a primeira linha com 'TOTAL' na coluna-chave, abaixo do cabeçalho."""
+
+    def __init__(self, assinatura, eh_cabecalho, coluna_chave):
+        self.assinatura = assinatura      # entra na chave do cache
+        self.eh_cabecalho = eh_cabecalho  # lista de valores da linha -> bool
+        self.coluna_chave = coluna_chave  # valores da linha de cabeçalho -> índice ou None
+
+    def eh_total(self, valores, coluna):
+        return coluna is not None and coluna < len(valores) and pd.notna(valores[coluna]) and 'TOTAL' in str(valores[coluna]).upper()
+
+    def cortar(self, linhas):
+        # Devolve quantas linhas ficam (tudo antes do primeiro TOTAL).
+        coluna = None; achou_cabecalho = False
+        for i, valores in enumerate(linhas):
+            if not achou_cabecalho:
+                if i < LINHAS_BUSCA_CABECALHO and self.eh_cabecalho(valores):
+                    achou_cabecalho = True; coluna = self.coluna_chave(valores)
+            elif self.eh_total(valores, coluna): return i
+        return len(linhas)
+
+
+def _inferir_tipo(serie):
+    # Mesma inferência que o read_excel faz por coluna:
+    # tenta numérico (inclusive texto "001" -> 1) e depois datas/objetos.
+    if serie.dtype != object: return serie
+    try: return pd.to_numeric(serie)
+    except (ValueError, TypeError): return serie.infer_objects()
+
+def _grade(linhas):
+    largura = max((len(l) for l in linhas), default=0)
+    df = pd.DataFrame([l + [np.nan] * (largura - len(l)) for l in linhas], dtype=object)
+    return pd.DataFrame({c: _inferir_tipo(df[c]) for c in df.columns}) if len(df.columns) else df
+
+def _converter_celula(celula):
+    # Igual ao OpenpyxlReader._convert_cell do pandas
+    valor = celula.value
+    if valor is None: return ""
+    if celula.data_type == 'e': return np.nan
+    if celula.data_type == 'n' and isinstance(valor, float):
+        inteiro = int(valor)
+        return inteiro if inteiro == valor else valor
+    return valor
+
+def _normalizar_linha(valores):
+    while valores and valores[-1] == "": valores.pop()
+    return [np.nan if isinstance(v, str) and v in _VALORES_NA else v for v in valores]
+
+
+class PlanilhaBruta:
+    def __init__(self, caminho, hash_conteudo=None, motor=None):
+        self.caminho = caminho
+        self.hash = hash_conteudo
+        self.motor = motor or settings.MOTOR_EXCEL
+        if self.motor == 'calamine':
+            try: import python_calamine  # noqa: F401
+            except ImportError:
+                print("     [AVISO] python-calamine não instalado. Usando 'streaming'.")
+                self.motor = 'streaming'
+        self._xls = None; self._wb = None
+        self._abas = {}
+        self.sheet_names = self._ler_nomes_abas()
+
+    def _excel(self):
+        if self._xls is None:
+            self._xls = pd.ExcelFile(self.caminho, engine='calamine' if self.motor == 'calamine' else None)
+        return self._xls
+
+    def _workbook(self):
+        if self._wb is None:
+            from openpyxl import load_workbook
+            self._wb = load_workbook(self.caminho, read_only=True, data_only=True, keep_links=False)
+        return self._wb
+
+    def fechar(self):
+        if self._wb is not None: self._wb.close(); self._wb = None
+        if self._xls is not None: self._xls.close(); self._xls = None
+
+    def _chave(self, sufixo): return f"{self.hash}_bruto_{sufixo}" if self.hash else None
+
+    def _ler_nomes_abas(self):
+        chave = self._chave('abas')
+        if chave:
+            df_abas = etl_cache.ler(chave)
+            if df_abas is not None: return df_abas['aba'].tolist()
+        nomes = list(self._workbook().sheetnames if self.motor == 'streaming' else self._excel().sheet_names)
+        if chave: etl_cache.gravar(chave, pd.DataFrame({'aba': nomes}))
+        return nomes
+
+    def _ler_streaming(self, nome, limite, nrows):
+        ws = self._workbook()[nome]
+        ws.reset_dimensions()
+        linhas = []; ultima_com_dado = -1
+        coluna = None; achou_cabecalho = False
+        for i, row in enumerate(ws.iter_rows()):
+            valores = _normalizar_linha([_converter_celula(c) for c in row])
+            if valores: ultima_com_dado = i
+            if limite is not None and valores:
+                if not achou_cabecalho:
+                    if i < LINHAS_BUSCA_CABECALHO and limite.eh_cabecalho(valores):
+                        achou_cabecalho = True; coluna = limite.coluna_chave(valores)
+                elif limite.eh_total(valores, coluna): break
+            linhas.append(valores)
+            if nrows is not None and len(linhas) >= nrows: break
+        return _grade(linhas[:ultima_com_dado + 1])
+
+    def _ler_pandas(self, nome, limite, nrows):
+        df = pd.read_excel(self._excel(), sheet_name=nome, header=None, nrows=nrows, dtype=object)
+        linhas = [[np.nan if isinstance(v, str) and v == '' else v for v in row] for row in df.itertuples(index=False, name=None)]
+        if limite is not None: linhas = linhas[:limite.cortar(linhas)]
+        return _grade(linhas)
+
+    def aba(self, nome, limite=None, nrows=None):
+        """Grade da aba (header=None). Com `limite`, para antes da primeira linha TOTAL."""
+        memoria = (nome, limite.assinatura if limite else None, nrows)
+        if memoria in self._abas: return self._abas[memoria]
+        sufixo = hashlib.sha1(repr((self.motor,) + memoria).encode('utf-8')).hexdigest()[:12]
+        chave = self._chave(sufixo)
+        df_bruto = etl_cache.ler(chave) if chave else None
+        if df_bruto is None:
+            if self.motor == 'streaming': df_bruto = self._ler_streaming(nome, limite, nrows)
+            else: df_bruto = self._ler_pandas(nome, limite, nrows)
+            if chave: etl_cache.gravar(chave, df_bruto)
+        self._abas[memoria] = df_bruto
+        return df_bruto
+
+
+def promover_cabecalho(df_bruto, linha):
+    """Equivalente a pd.read_excel(..., header=linha) sobre a grade lida com header=None."""
+    nomes = []; contagem = {}
+    for i, valor in enumerate(df_bruto.iloc[linha].tolist()):
+        nome = f"Unnamed: {i}" if pd.isna(valor) else valor
+        vezes = contagem.get(nome, 0)
+        while vezes > 0:  # duplicados viram "nome.1", "nome.2"... como no pandas
+            contagem[nome] = vezes + 1
+            nome = f"{nome}.{vezes}"; vezes = contagem.get(nome, 0)
+        contagem[nome] = vezes + 1
+        nomes.append(nome)
+    corpo = df_bruto.iloc[linha + 1:].reset_index(drop=True)
+    return pd.DataFrame({nome: _inferir_tipo(corpo.iloc[:, i]) for i, nome in enumerate(nomes)})
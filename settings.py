@@ -79,4 +79,79 @@ SINONIMOS_BRADESCO = {
     'insertion_faces_period': ['faces'],
     'location':        ['mídia', 'midia'], 
     'size':            ['formato'],
-}
\ No newline at end of file
+}
+
+# --- CARGA NO BANCO ---
+# 'copy'  -> COPY FROM STDIN via psycopg2 (padrão, cai para 'multi' se falhar)
+# 'multi' -> to_sql(method='multi'), o caminho antigo
+METODO_CARGA = 'copy'
+COPY_LOTE_LINHAS = 100_000
+
+# --- CACHE DOS PLANOS LIDOS ---
+# Grades brutas (por hash do arquivo) e saída padronizada dos leitores
+# (por hash + VERSAO_LEITOR). Suba VERSAO_LEITOR ao mudar a lógica de
+# ler_plano_padrao / ler_plano_bradesco.
+PASTA_CACHE = '.cache_etl'
+CACHE_TAMANHO_MAX_MB = 2048
+VERSAO_LEITOR = 2
+
+# --- LEITURA DO EXCEL ---
+# 'streaming' -> openpyxl read_only, linha a linha, parando no primeiro TOTAL
+# 'openpyxl'  -> pd.read_excel tradicional (aba inteira)
+# 'calamine'  -> mais rápido, precisa de `pip install python-calamine`
+MOTOR_EXCEL = 'streaming'
+
+# --- TRANSAÇÕES ---
+# 'unica'   -> a execução inteira numa transação (tudo ou nada)
+# 'arquivo' -> commit por arquivo, com checkpoint em etl_checkpoint para retomar
+MODO_TRANSACAO = 'unica'
+
+# --- ATUALIZAÇÃO DE ARQUIVOS JÁ CARREGADOS ---
+# 'merge'      -> aplica só as linhas inseridas/alteradas/removidas (chave_linha)
+# 'substituir' -> apaga tudo do arquivo e reinsere
+MODO_ATUALIZACAO = 'merge'
+
+# --- MODO WATCH (python etl_midia.py --watch) ---
+# 'auto'    -> eventos do sistema (watchdog/inotify) se instalado, senão polling
+# 'inotify' -> força eventos do sistema
+# 'polling' -> lista a pasta a cada intervalo (use em pastas de rede/SMB)
+MODO_OBSERVADOR = 'auto'
+OBSERVADOR_INTERVALO_S = 5
+OBSERVADOR_ESPERA_S = 10   # tempo sem alterações antes de processar o arquivo
+OBSERVADOR_TENTATIVAS = 6  # arquivo ilegível (travado/sincronizando) volta para a fila com espera dobrando
+
+# --- MÉTRICAS E LOGS ---
+# Arquivo .prom para o textfile collector do node_exporter (None desliga)
+METRICAS_ARQUIVO_PROM = 'metricas/etl_midia.prom'
+METRICAS_PUSHGATEWAY = None   # ex.: 'localhost:9091' para enviar também ao Pushgateway
+LOG_JSON = 'metricas/etl_midia.jsonl'   # uma linha JSON por arquivo/etapa (None desliga)
+# > 0: roda cProfile em cada arquivo e grava os N mais lentos em PASTA_PERFIS
+# (abra com `python -m pstats` ou snakeviz). Deixa a execução mais lenta.
+PERFIL_TOP_N = 0
+PASTA_PERFIS = 'metricas/perfis'
+
+# --- MEMÓRIA ---
+# 'normal' -> DataFrames como sempre
+# 'enxuto' -> depois da limpeza, texto repetitivo (market, state, exibidor...) vira
+#             category e colunas numéricas viram float32 quando não perdem precisão;
+#             reduz a memória de cada plano e o tráfego entre os --workers
+MODO_MEMORIA = 'normal'
+LIMIAR_CATEGORIA = 0.5        # vira category se valores distintos <= 50% das linhas
+# Não há teto de memória por plano: cada aba é lida, limpa e carregada inteira.
+
+# --- FATO DIARIZADA ---
+# Mantém fato_midia_diaria (custos e impactos espalhados por dia) atualizada a cada
+# execução, só nos dias dos arquivos que mudaram. Recálculo total: --reconstruir-diaria
+MANTER_DIARIA = True
+
+# --- VÁRIAS INSTÂNCIAS (python etl_midia.py --compartilhado) ---
+# Permite rodar o ETL em mais de uma máquina/processo sobre a mesma pasta e banco:
+# cada pasta de cliente é processada por uma instância só (advisory lock no Postgres)
+# e força commit por arquivo. Os locks somem sozinhos se a instância cair.
+MODO_COMPARTILHADO = False
+
+# --- EXPORTAÇÃO PARQUET (POWER BI) ---
+# Fato em <pasta>/fato_midia/id_cliente=<id>/mes=<AAAA-MM>/ e dimensões em <pasta>/dimensoes/.
+# A cada execução só as partições dos arquivos novos/alterados/removidos são regravadas.
+# Precisa de `pip install pyarrow`. None desliga. Regravar tudo: --reexportar
+PASTA_EXPORTACAO = 'exportacao'